@@ -1,14 +1,22 @@
 # ba_meta require api 9
-import babase
-import _babase
-import _bauiv1
-import _bascenev1
-import bauiv1 as bui
-from bauiv1lib import popup, confirm
-from babase._meta import EXPORT_CLASS_NAME_SHORTCUTS
-from bauiv1lib.settings.allsettings import AllSettingsWindow
+try:
+    import babase
+    import _babase
+    import _bauiv1
+    import _bascenev1
+    import bauiv1 as bui
+    from bauiv1lib import popup, confirm
+    from babase._meta import EXPORT_CLASS_NAME_SHORTCUTS
+    from bauiv1lib.settings.allsettings import AllSettingsWindow
+except ImportError:
+    # We're not running inside the game but from the command line, see
+    # `headless_main()` at the bottom.
+    _IS_HEADLESS = True
+else:
+    _IS_HEADLESS = False
 
 import urllib.request
+import urllib.response
 import http.client
 import socket
 import json
@@ -18,18 +26,127 @@ import re
 import os
 import sys
 import copy
+import time
 import asyncio
-import pathlib
+import gzip
+import io
 import hashlib
+import threading
 import contextlib
-
-from typing import cast, override
+import contextvars
+import collections
+import shutil
+import concurrent.futures
+import argparse
+import types
+
+from typing import cast
+try:
+    from typing import override
+except ImportError:
+    # Python < 3.12, which can only be the case when running headless.
+    def override(method): return method
 from datetime import datetime
 
 # Modules used for overriding AllSettingsWindow
 import logging
 
-PLUGIN_MANAGER_VERSION = "1.1.4"
+
+class _HeadlessStub:
+    """
+    Stands in for anything from the game's modules that only the UI needs,
+    which is never shown when running headless. It can be subclassed, and any
+    attribute of it or call to it gives back another stub.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _HeadlessStub()
+
+    def __call__(self, *args, **kwargs):
+        return _HeadlessStub()
+
+
+class _HeadlessModule(types.ModuleType):
+    def __getattr__(self, name):
+        return _HeadlessStub
+
+
+class HeadlessConfig(dict):
+    """
+    Stands in for `babase.app.config` when running headless. It's backed by
+    the game's config.json (if there's one at `path`), so that plugins set up
+    from the command line show up as installed and enabled once the game is
+    launched. A `read_only` config is loaded from `path` but never written back.
+    """
+
+    def __init__(self, path=None, read_only=False):
+        super().__init__()
+        self.path = path
+        self.read_only = read_only
+        if path is not None and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as fin:
+                self.update(json.load(fin))
+
+    def commit(self):
+        if self.path is not None and not self.read_only:
+            write_file_atomically(self.path, json.dumps(self, indent=2).encode("utf-8"))
+
+
+def _headless_screenmessage(message, color=None, **kwargs):
+    print(message)
+
+
+def _create_headless_runtime():
+    """
+    Return stand-ins for the game modules imported at the top, providing only
+    what plugin manager needs to resolve, download and install plugins.
+    """
+    app = types.SimpleNamespace(
+        config=HeadlessConfig(),
+        env=types.SimpleNamespace(
+            # Same as the API version this file requires at the top.
+            api_version=9,
+            cache_directory=os.path.join(os.path.expanduser("~"), ".cache"),
+        ),
+        plugins=types.SimpleNamespace(plugin_specs={}, active_plugins=[]),
+    )
+    babase = _HeadlessModule("babase")
+    babase.app = app
+    babase._asyncio = types.SimpleNamespace(_asyncio_event_loop=asyncio.new_event_loop())
+    _babase = _HeadlessModule("_babase")
+    _babase.env = lambda: {
+        "python_directory_user": os.getcwd(),
+        "legacy_user_agent_string": f"PluginManager/{PLUGIN_MANAGER_VERSION} (headless)",
+    }
+    bui = _HeadlessModule("bauiv1")
+    bui.app = app
+    bui.screenmessage = _headless_screenmessage
+    export_class_name_shortcuts = {
+        "plugin": "babase.Plugin",
+        "keyboard": "babase.Keyboard",
+        "game": "bascenev1.GameActivity",
+    }
+    return (
+        babase,
+        _babase,
+        _HeadlessModule("_bauiv1"),
+        _HeadlessModule("_bascenev1"),
+        bui,
+        _HeadlessModule("popup"),
+        _HeadlessModule("confirm"),
+        _HeadlessStub,
+        export_class_name_shortcuts,
+    )
+
+
+if _IS_HEADLESS:
+    (babase, _babase, _bauiv1, _bascenev1, bui, popup, confirm,
+     AllSettingsWindow, EXPORT_CLASS_NAME_SHORTCUTS) = _create_headless_runtime()
+
+PLUGIN_MANAGER_VERSION = "1.1.5"
 REPOSITORY_URL = "https://github.com/bombsquad-community/plugin-manager"
 # Current tag can be changed to "staging" or any other branch in
 # plugin manager repo for testing purpose.
@@ -39,11 +156,42 @@ _env = _babase.env()
 _app_api_version = babase.app.env.api_version
 
 INDEX_META = "{repository_url}/{content_type}/{tag}/index.json"
+# Holds index.json along with the metadata of all the categories it lists.
+CATALOG_META = "{repository_url}/{content_type}/{tag}/catalog.json.gz"
 CHANGELOG_META = "{repository_url}/{content_type}/{tag}/CHANGELOG.md"
 HEADERS = {
     "User-Agent": _env["legacy_user_agent_string"],
 }
 PLUGIN_DIRECTORY = _env["python_directory_user"]
+# Number of plugins that are allowed to be downloaded at once while updating
+# plugins in bulk. Can be overridden through the "Max Parallel Updates" key in
+# plugin manager's config.
+MAX_PARALLEL_UPDATES = 4
+CACHE_DIRECTORY = os.path.join(babase.app.env.cache_directory, "plugin_manager")
+NETWORK_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "network")
+LOCAL_PLUGIN_INDEX_PATH = os.path.join(CACHE_DIRECTORY, "local_plugins.json")
+PLUGIN_STORE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "store")
+# Number of the most recent timing spans kept in memory while timings are
+# being recorded.
+MAX_TRACE_SPANS = 2000
+# Not a python file, so the game doesn't try to import it.
+TRACE_DUMP_PATH = os.path.join(PLUGIN_DIRECTORY, "plugin_manager_timings.json")
+# Bytes the plugin store may take up before the least recently used plugin
+# files are removed from it.
+MAX_PLUGIN_STORE_SIZE = 32 * 1024 * 1024
+# Hosts plugin manager talks to right after launch, resolved in advance.
+# raw.githubusercontent.com is where raw files from the repository get
+# redirected to.
+DNS_PREWARM_HOSTNAMES = (
+    urllib.parse.urlsplit(REPOSITORY_URL).hostname,
+    "raw.githubusercontent.com",
+)
+# Seconds for which addresses resolved by the system resolver are reused,
+# since it doesn't tell us their actual TTL.
+SYSTEM_DNS_TTL = 300
+# Seconds to wait for a connection before failing over to the next address
+# of a host.
+FAILOVER_CONNECT_TIMEOUT = 3
 loop = babase._asyncio._asyncio_event_loop
 
 open_popups = []
@@ -112,8 +260,160 @@ class CategoryMetadataParseError(Exception):
     pass
 
 
+class Tracer:
+    """
+    Records how long plugin manager's network and install steps take (DNS
+    lookups, connections, TLS handshakes, fetches, downloads, MD5 checks and
+    config commits) as spans with a start and end time, along with details
+    such as bytes transferred, retries and cache hits. Nothing is recorded
+    unless it's enabled through the "Record Timings" setting. Only the most
+    recent `max_spans` spans are kept.
+
+    Usage:
+    -----
+    >>> with _TRACER.span("download", url=url) as span:
+    ...     span["bytes"] = len(download(url))
+    """
+
+    def __init__(self, max_spans=MAX_TRACE_SPANS):
+        self.enabled = False
+        self._spans = collections.deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **details):
+        if not self.enabled:
+            yield details
+            return
+        start = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield details
+        except BaseException as e:
+            details["error"] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start_counter
+            span = {
+                "name": name,
+                "start": start,
+                "end": start + duration,
+                "duration_ms": duration * 1000,
+                "thread": threading.current_thread().name,
+                **details,
+            }
+            with self._lock:
+                self._spans.append(span)
+
+    @property
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summarize(self):
+        """
+        Return the count, total and longest duration, errors and bytes of the
+        recorded spans, grouped by their name.
+        """
+        summary = {}
+        for span in self.spans:
+            totals = summary.setdefault(span["name"], {
+                "count": 0,
+                "total_ms": 0,
+                "max_ms": 0,
+                "errors": 0,
+                "bytes": 0,
+            })
+            totals["count"] += 1
+            totals["total_ms"] += span["duration_ms"]
+            totals["max_ms"] = max(totals["max_ms"], span["duration_ms"])
+            totals["errors"] += "error" in span
+            totals["bytes"] += span.get("bytes", 0)
+        return summary
+
+    def dump(self, path=TRACE_DUMP_PATH):
+        content = {
+            "plugin_manager_version": PLUGIN_MANAGER_VERSION,
+            "api_version": _app_api_version,
+            "summary": self.summarize(),
+            "spans": self.spans,
+        }
+        write_file_atomically(path, json.dumps(content, indent=2, default=str).encode("utf-8"))
+        return path
+
+
+_TRACER = Tracer()
+
+
+class ConfigCommitter:
+    """
+    Writes the game's config to disk, which rewrites the whole file every
+    time. Commits made inside `batch()` are held back and done once when the
+    outermost batch ends, so operations on many plugins at once (such as
+    updating them all) don't rewrite the config once per plugin.
+
+    A batch belongs to the task that opened it (and the tasks it starts), so
+    commits made by anything else in the meantime, like the settings window,
+    go through right away. Batches shouldn't be kept open across network I/O,
+    which could leave commits held back for a long time.
+
+    Usage:
+    -----
+    >>> with _CONFIG_COMMITTER.batch():
+    ...     for plugin in plugins:
+    ...         await plugin.get_local().enable()
+    """
+
+    def __init__(self):
+        # Whether a commit is pending, in a list shared with the tasks
+        # started inside the batch.
+        self._batch = contextvars.ContextVar("config_batch", default=None)
+
+    def commit(self):
+        batch = self._batch.get()
+        if batch is not None:
+            batch[0] = True
+            return
+        with _TRACER.span("config_commit"):
+            babase.app.config.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        if self._batch.get() is not None:
+            # Nested in an outer batch, which does the commit.
+            yield
+            return
+        batch = [False]
+        token = self._batch.set(batch)
+        try:
+            yield
+        finally:
+            self._batch.reset(token)
+            if batch[0]:
+                self.commit()
+
+
+_CONFIG_COMMITTER = ConfigCommitter()
+
+
+def commit_config():
+    _CONFIG_COMMITTER.commit()
+
+
 def send_network_request(request):
-    return urllib.request.urlopen(request)
+    """
+    Send `request` over a pooled connection and return the response once it
+    has been read completely, so the connection can go back to the pool. The
+    returned response can be used like the one `urllib.request.urlopen` returns.
+    """
+    with _CONNECTION_POOL.urlopen(request, headers=HEADERS) as response:
+        content = response.read()
+    url = request.full_url if isinstance(request, urllib.request.Request) else request
+    return urllib.response.addinfourl(io.BytesIO(content), response.headers, url, response.status)
 
 
 async def async_send_network_request(request):
@@ -121,33 +421,533 @@ async def async_send_network_request(request):
     return response
 
 
-def stream_network_response_to_file(request, file, md5sum=None, retries=3):
-    response = urllib.request.urlopen(request)
-    chunk_size = 16 * 1024
-    content = b""
-    with open(file, "wb") as fout:
-        while True:
-            chunk = response.read(chunk_size)
-            if not chunk:
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same resource. The first caller for a
+    key starts the work and everyone else asking for that key while it's still
+    in flight awaits the same future, getting the same result or exception.
+    The work is only cancelled once every caller awaiting it got cancelled.
+    """
+
+    def __init__(self):
+        # Maps a key to the task doing the work and the number of its waiters.
+        self._in_flight = {}
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key, (None,))[0] is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved, in case nobody awaits it anymore.
+            task.exception()
+
+    async def run(self, key, coroutine_function, *args):
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            task = asyncio.ensure_future(coroutine_function(*args), loop=loop)
+            in_flight = [task, 0]
+            self._in_flight[key] = in_flight
+            task.add_done_callback(lambda task: self._forget(key, task))
+        task = in_flight[0]
+        in_flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and in_flight[1] == 1:
+                # Callers coming after shouldn't join work that's being cancelled.
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+                task.cancel()
+            raise
+        finally:
+            in_flight[1] -= 1
+
+
+_SINGLE_FLIGHT = SingleFlight()
+
+
+class NetworkCache:
+    """
+    Persists text resources fetched over the network (index, category metadata
+    and changelog) in the app's cache directory, along with the validators
+    (ETag/Last-Modified) the server sent with them. This lets the next launch
+    revalidate the resource with a conditional request instead of downloading
+    it again, and keeps the last known copy around for when we're offline.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _get_path(self, url):
+        return os.path.join(self.directory, f"{hashlib.md5(url.encode('utf-8')).hexdigest()}.json")
+
+    def get(self, url):
+        try:
+            with open(self._get_path(url), "r", encoding="utf-8") as fin:
+                entry = json.load(fin)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        return entry
+
+    def set(self, url, content, headers):
+        entry = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content": content,
+        }
+        path = self._get_path(url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Several headless plugin managers may share the same cache directory.
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as fout:
+                json.dump(entry, fout)
+            os.replace(temporary_path, path)
+        except OSError:
+            # Not being able to cache shouldn't stop plugin manager from working.
+            pass
+        return entry
+
+    def get_content(self, url):
+        entry = self.get(url)
+        return None if entry is None else entry["content"]
+
+    def add_conditional_headers(self, request, entry):
+        if entry["etag"]:
+            request.add_header("If-None-Match", entry["etag"])
+        if entry["last_modified"]:
+            request.add_header("If-Modified-Since", entry["last_modified"])
+        return request
+
+
+_NETWORK_CACHE = NetworkCache(NETWORK_CACHE_DIRECTORY)
+
+
+class LocalPluginIndex:
+    """
+    Persists what plugin manager needs to know about the plugin files installed
+    on the device (API version, entry points, exported minigames and their MD5
+    checksum), keyed by the file's path. Each entry remembers the size
+    and modification time of the file it was computed from, and is only used as
+    long as the file on disk still matches them. This saves re-reading and
+    regex-scanning every installed plugin on each launch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._is_save_scheduled = False
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as fin:
+                    self._entries = json.load(fin)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, path, stat):
+        entry = self._load().get(path)
+        if entry is None:
+            return None
+        if (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return entry
+
+    def set(self, path, stat, content):
+        api_version = REGEXP["plugin_api_version"].search(content)
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "api_version": None if api_version is None else api_version.group().decode("utf-8"),
+            # Actual entry points are stored in the last index inside the matching groups.
+            "entry_points": [group[-1].decode("utf-8")
+                             for group in REGEXP["plugin_entry_points"].findall(content)],
+            "minigames": [group[-1].decode("utf-8")
+                          for group in REGEXP["minigames"].findall(content)],
+            "md5sum": hashlib.md5(content).hexdigest(),
+        }
+        self._load()[path] = entry
+        self.schedule_save()
+        return entry
+
+    def discard(self, path):
+        if self._load().pop(path, None) is not None:
+            self.schedule_save()
+
+    def prune(self, directory, file_names):
+        """
+        Forget the plugins in `directory` that aren't in `file_names` anymore.
+        """
+        for path in tuple(self._load().keys()):
+            path_directory, file_name = os.path.split(path)
+            if path_directory == directory and file_name not in file_names:
+                self.discard(path)
+
+    def schedule_save(self):
+        # A bunch of entries usually change together (e.g. on the first launch),
+        # so they're written to disk once the current batch of work is done.
+        if not self._is_save_scheduled:
+            self._is_save_scheduled = True
+            loop.call_soon(self.save)
+
+    def save(self):
+        self._is_save_scheduled = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as fout:
+                json.dump(self._load(), fout)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError:
+            # The index is only a cache, it'll be rebuilt from the plugin files.
+            pass
+
+
+_LOCAL_PLUGIN_INDEX = LocalPluginIndex(LOCAL_PLUGIN_INDEX_PATH)
+
+
+def link_or_copy_file(source, destination):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Hard links aren't supported everywhere (e.g. Android's shared
+        # storage, or across file systems).
+        shutil.copyfile(source, destination)
+
+
+class PluginStore:
+    """
+    Keeps every plugin file that has been installed, keyed by its MD5 checksum
+    (the same one the category metadata lists for each version). Installing a
+    version that's already in the store only links (or copies) it into the
+    plugin directory, so reinstalling a plugin or switching between its
+    versions needs no downloads. The least recently used files are removed
+    once the store grows past `max_size` bytes.
+    """
+
+    def __init__(self, directory, max_size=MAX_PLUGIN_STORE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_path(self, md5sum):
+        return os.path.join(self.directory, md5sum)
+
+    def has(self, md5sum):
+        return os.path.isfile(self.get_path(md5sum))
+
+    def _touch(self, path):
+        # The access time keeps track of when a file was last used, while the
+        # modification time is left alone since a hard linked plugin file shares
+        # it, and the local plugin index relies on that.
+        stat = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+    def add(self, md5sum, file):
+        """
+        Put a copy of `file`, whose MD5 checksum is `md5sum`, in the store.
+        """
+        path = self.get_path(md5sum)
+        try:
+            if not os.path.isfile(path):
+                os.makedirs(self.directory, exist_ok=True)
+                temporary_path = f"{path}.{os.getpid()}.part"
+                link_or_copy_file(file, temporary_path)
+                os.replace(temporary_path, path)
+            self._touch(path)
+        except OSError:
+            # The store only saves downloads, plugins install fine without it.
+            return
+        self.collect_garbage()
+
+    def materialize(self, md5sum, file):
+        """
+        Install the stored file with `md5sum` as `file`, returning its content,
+        or None if the store doesn't have it.
+        """
+        path = self.get_path(md5sum)
+        try:
+            content = read_file_into_memoryview(path)
+        except OSError:
+            return None
+        if hashlib.md5(content).hexdigest() != md5sum:
+            # The installed plugin file got edited in place, which changes the
+            # stored file too when they're hard links of each other.
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+        # Shouldn't end with ".py", or the game may pick it up as a module.
+        temporary_file = f"{file}.part"
+        link_or_copy_file(path, temporary_file)
+        os.replace(temporary_file, file)
+        self._touch(path)
+        return content
+
+    def collect_garbage(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                files = [
+                    (entry.stat(), entry.path) for entry in entries
+                    if not entry.name.endswith(".part") and entry.is_file()
+                ]
+        except OSError:
+            return
+        size = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda file: file[0].st_atime_ns):
+            if size <= self.max_size:
                 break
-            fout.write(chunk)
-            content += chunk
-    if md5sum and hashlib.md5(content).hexdigest() != md5sum:
-        if retries <= 0:
-            raise MD5CheckSumFailed("MD5 checksum match failed.")
-        return stream_network_response_to_file(
-            request,
-            file,
-            md5sum=md5sum,
-            retries=retries-1,
-        )
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                size -= stat.st_size
+
+
+_PLUGIN_STORE = PluginStore(PLUGIN_STORE_DIRECTORY)
+
+
+class ExportRegistry:
+    """
+    Adds and removes classes of the given type in the exports the game found
+    while scanning for plugins (`babase.app.meta.scanresults`), which is how
+    the game lists e.g. the minigames it can play. Membership is checked using
+    a set kept in step with the game's list, rebuilding it only when the game
+    replaces the list or something else changes its length.
+    """
+
+    def __init__(self, class_name):
+        self.class_name = class_name
+        self._exports = None
+        self._exports_length = 0
+        self._exports_set = set()
+
+    def _get_exports(self):
+        exports = babase.app.meta.scanresults.exports.setdefault(self.class_name, [])
+        if exports is not self._exports or len(exports) != self._exports_length:
+            self._exports = exports
+            self._exports_set = set(exports)
+        return exports
+
+    def register(self, class_paths):
+        """
+        Add `class_paths` to the exports, returning the ones that weren't
+        there already.
+        """
+        exports = self._get_exports()
+        registered = []
+        for class_path in class_paths:
+            if class_path not in self._exports_set:
+                exports.append(class_path)
+                self._exports_set.add(class_path)
+                registered.append(class_path)
+        self._exports_length = len(exports)
+        return registered
+
+    def unregister(self, class_paths):
+        """
+        Remove `class_paths` from the exports, returning the ones that were
+        there.
+        """
+        exports = self._get_exports()
+        unregistered = [
+            class_path for class_path in class_paths if class_path in self._exports_set
+        ]
+        if unregistered:
+            self._exports_set.difference_update(unregistered)
+            # Edited in place, since the game may be holding on to the list.
+            exports[:] = [
+                class_path for class_path in exports if class_path in self._exports_set
+            ]
+        self._exports_length = len(exports)
+        return unregistered
+
+
+_MINIGAME_REGISTRY = ExportRegistry("bascenev1.GameActivity")
+
+
+def get_plugin_file_names(directory):
+    """
+    Return the names of all python files in `directory`, using a single
+    directory scan instead of checking for each plugin file separately.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return {
+                entry.name for entry in entries
+                if entry.name.endswith(".py") and entry.is_file()
+            }
+    except OSError:
+        return set()
+
+
+def decode_text(content):
+    return content.decode("utf-8")
+
+
+def decode_gzipped_text(content):
+    return gzip.decompress(content).decode("utf-8")
+
+
+def send_cached_network_request(request, decode=decode_text):
+    """
+    Return the body of `request` decoded to text by `decode`, reusing the copy
+    cached on disk if the server reports it hasn't changed (or if the server
+    can't be reached at all).
+    """
+    url = request.full_url
+    with _TRACER.span("fetch", url=url, cache="miss") as span:
+        entry = _NETWORK_CACHE.get(url)
+        if entry is not None:
+            _NETWORK_CACHE.add_conditional_headers(request, entry)
+        try:
+            response = send_network_request(request)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                span["cache"] = "not_modified"
+                return entry["content"]
+            raise
+        except urllib.error.URLError:
+            if entry is not None:
+                span["cache"] = "offline"
+                return entry["content"]
+            raise
+        content = response.read()
+        span["bytes"] = len(content)
+        content = decode(content)
+        _NETWORK_CACHE.set(url, content, response.headers)
+        return content
+
+
+async def async_send_cached_network_request(request, decode=decode_text):
+    # Index, categories and changelog are asked for by both the startup tasks
+    # and plugin manager's window, so only one request per URL is sent at a time.
+    content = await _SINGLE_FLIGHT.run(
+        (request.full_url, decode),
+        loop.run_in_executor,
+        None,
+        send_cached_network_request,
+        request,
+        decode,
+    )
+    return content
+
+
+def read_file_into_memoryview(file):
+    with open(file, "rb") as fin:
+        content = bytearray(os.fstat(fin.fileno()).st_size)
+        fin.readinto(content)
+    return memoryview(content)
+
+
+def _stream_network_response_to_temporary_file(request, file):
+    """
+    Download `request` to `file` while hashing it chunk by chunk, returning
+    the MD5 hex digest of what was written.
+    """
+    chunk_size = 16 * 1024
+    md5 = hashlib.md5()
+    try:
+        with _CONNECTION_POOL.urlopen(request, headers=HEADERS) as response:
+            with open(file, "wb") as fout:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    fout.write(chunk)
+                fout.flush()
+                os.fsync(fout.fileno())
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file)
+        raise
+    return md5.hexdigest()
+
+
+def stream_network_response_to_file(request, file, md5sum=None, retries=3):
+    """
+    Download `request` to `file`. The download is first written to a
+    temporary file next to `file` and only moved in place once its MD5
+    checksum matches, so an interrupted or corrupted download never ends up
+    being imported by the game.
+    """
+    # Shouldn't end with ".py", or the game may pick it up as a module.
+    temporary_file = f"{file}.part"
+    for attempt in range(retries + 1):
+        with _TRACER.span("download", url=request, attempt=attempt) as span:
+            checksum = _stream_network_response_to_temporary_file(request, temporary_file)
+            span["bytes"] = os.path.getsize(temporary_file)
+            span["md5_match"] = md5sum is None or checksum == md5sum
+        if span["md5_match"]:
+            os.replace(temporary_file, file)
+            return read_file_into_memoryview(file)
+        os.remove(temporary_file)
+    raise MD5CheckSumFailed("MD5 checksum match failed.")
+
+
+def apply_line_patch(content, operations):
+    """
+    Apply a line based patch, as generated by test/auto_apply_version_metadata.py,
+    to `content`. A positive integer operation copies that many lines from
+    `content`, a negative one skips that many lines, and a string is inserted
+    as is.
+    """
+    lines = bytes(content).decode("utf-8", "surrogateescape").splitlines(keepends=True)
+    patched_lines = []
+    position = 0
+    for operation in operations:
+        if isinstance(operation, str):
+            patched_lines.append(operation)
+        elif operation > 0:
+            patched_lines.extend(lines[position:position + operation])
+            position += operation
+        else:
+            position -= operation
+    return "".join(patched_lines).encode("utf-8", "surrogateescape")
+
+
+def write_file_atomically(file, content):
+    temporary_file = f"{file}.part"
+    with open(temporary_file, "wb") as fout:
+        fout.write(content)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(temporary_file, file)
+
+
+def patch_file(request, file, md5sum):
+    """
+    Patch `file` in place using the patch at `request`, as long as the file
+    is what the patch was generated from and the outcome matches `md5sum`.
+    """
+    with open(file, "rb") as fin:
+        content = fin.read()
+    with _TRACER.span("download_patch", url=request) as span:
+        with _CONNECTION_POOL.urlopen(request, headers=HEADERS) as response:
+            patch = response.read()
+        span["bytes"] = len(patch)
+    patch = json.loads(patch)
+    if hashlib.md5(content).hexdigest() != patch["from_md5sum"]:
+        raise MD5CheckSumFailed("Plugin has been modified since it was installed.")
+    patched_content = apply_line_patch(content, patch["operations"])
+    if hashlib.md5(patched_content).hexdigest() != md5sum:
+        raise MD5CheckSumFailed("MD5 checksum match failed after patching.")
+    write_file_atomically(file, patched_content)
+    return memoryview(patched_content)
+
+
+async def async_patch_file(request, file, md5sum, executor=None):
+    content = await loop.run_in_executor(executor, patch_file, request, file, md5sum)
     return content
 
 
-async def async_stream_network_response_to_file(request, file, md5sum=None, retries=3):
+async def async_stream_network_response_to_file(request, file, md5sum=None, retries=3,
+                                                executor=None):
 
     content = await loop.run_in_executor(
-        None,
+        executor,
         stream_network_response_to_file,
         request,
         file,
@@ -186,7 +986,13 @@ class DNSBlockWorkaround:
     >>> response = urllib.request.urlopen("https://dnsblockeddomain.com/path/to/resource/")
     """
 
-    _google_dns_cache = {}
+    # Resolved addresses by hostname, along with when they expire.
+    _dns_cache = {}
+    _dns_cache_lock = threading.Lock()
+    _ssl_context = None
+    _ssl_context_lock = threading.Lock()
+    # TLS sessions to resume, keyed by (hostname, resolved address, port).
+    _tls_sessions = {}
 
     def apply():
         opener = urllib.request.build_opener(
@@ -195,31 +1001,115 @@ class DNSBlockWorkaround:
         )
         urllib.request.install_opener(opener)
 
+    def _get_ssl_context():
+        # Loading the default CA store is expensive (especially on Android), so
+        # a single context is shared by all HTTPS connections.
+        with DNSBlockWorkaround._ssl_context_lock:
+            if DNSBlockWorkaround._ssl_context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.check_hostname = True
+                context.load_default_certs()
+                DNSBlockWorkaround._ssl_context = context
+        return DNSBlockWorkaround._ssl_context
+
     def _resolve_using_google_dns(hostname):
-        response = urllib.request.urlopen(f"https://dns.google/resolve?name={hostname}")
+        response = urllib.request.urlopen(f"https://dns.google/resolve?name={hostname}&type=A")
         response = response.read()
         response = json.loads(response)
-        resolved_host = response["Answer"][0]["data"]
-        return resolved_host
+        # Answer may also hold the CNAME records that led to the A records.
+        records = [answer for answer in response["Answer"] if answer["type"] == 1]
+        if not records:
+            raise LookupError(f"dns.google has no address for {hostname}.")
+        resolved_hosts = [record["data"] for record in records]
+        ttl = min(record["TTL"] for record in records)
+        return resolved_hosts, ttl
 
     def _resolve_using_system_dns(hostname):
-        resolved_host = socket.gethostbyname(hostname)
-        return resolved_host
+        resolved_hosts = []
+        for *_, address in socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_STREAM):
+            if address[0] not in resolved_hosts:
+                resolved_hosts.append(address[0])
+        return resolved_hosts, SYSTEM_DNS_TTL
 
-    def _resolve_with_workaround(hostname):
-        resolved_host_from_cache = DNSBlockWorkaround._google_dns_cache.get(hostname)
-        if resolved_host_from_cache:
-            return resolved_host_from_cache
+    def _resolve_all_with_workaround(hostname):
+        """
+        Return all addresses `hostname` resolves to, preferred one first. These
+        are cached for as long as their TTL allows.
+        """
+        with DNSBlockWorkaround._dns_cache_lock:
+            cached = DNSBlockWorkaround._dns_cache.get(hostname)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        with _TRACER.span("dns", hostname=hostname, resolver="system") as span:
+            resolved_hosts, ttl = DNSBlockWorkaround._resolve_using_system_dns(hostname)
+            if any(DNSBlockWorkaround._is_blocked(hostname, resolved_host)
+                   for resolved_host in resolved_hosts):
+                span["resolver"] = "dns.google"
+                span["blocked_addresses"] = resolved_hosts
+                resolved_hosts, ttl = DNSBlockWorkaround._resolve_using_google_dns(hostname)
+            span["addresses"] = resolved_hosts
+            span["ttl"] = ttl
+
+        with DNSBlockWorkaround._dns_cache_lock:
+            DNSBlockWorkaround._dns_cache[hostname] = (time.monotonic() + ttl, resolved_hosts)
+        return resolved_hosts
 
-        resolved_host_by_system_dns = DNSBlockWorkaround._resolve_using_system_dns(hostname)
+    def _resolve_with_workaround(hostname):
+        return DNSBlockWorkaround._resolve_all_with_workaround(hostname)[0]
+
+    def _demote(hostname, resolved_host):
+        # Connections that come after go for the other addresses first, rather
+        # than waiting on an unreachable one until it expires.
+        with DNSBlockWorkaround._dns_cache_lock:
+            cached = DNSBlockWorkaround._dns_cache.get(hostname)
+            if cached is None or resolved_host not in cached[1]:
+                return
+            expires_at, resolved_hosts = cached
+            resolved_hosts = [host for host in resolved_hosts if host != resolved_host]
+            resolved_hosts.append(resolved_host)
+            DNSBlockWorkaround._dns_cache[hostname] = (expires_at, resolved_hosts)
 
-        if DNSBlockWorkaround._is_blocked(hostname, resolved_host_by_system_dns):
-            resolved_host = DNSBlockWorkaround._resolve_using_google_dns(hostname)
-            DNSBlockWorkaround._google_dns_cache[hostname] = resolved_host
-        else:
-            resolved_host = resolved_host_by_system_dns
+    def _create_connection(hostname, resolved_hosts, port, timeout):
+        """
+        Connect to the first of `resolved_hosts` that accepts a connection,
+        giving up on all but the last one early. Returns the socket along with
+        the address it's connected to.
+        """
+        with _TRACER.span("connect", hostname=hostname, failovers=0) as span:
+            for resolved_host in resolved_hosts[:-1]:
+                try:
+                    sock = socket.create_connection(
+                        (resolved_host, port), FAILOVER_CONNECT_TIMEOUT)
+                except OSError:
+                    DNSBlockWorkaround._demote(hostname, resolved_host)
+                    span["failovers"] += 1
+                    continue
+                sock.settimeout(timeout if isinstance(timeout, (int, float))
+                                else socket.getdefaulttimeout())
+                span["address"] = resolved_host
+                return sock, resolved_host
+            resolved_host = resolved_hosts[-1]
+            span["address"] = resolved_host
+            try:
+                sock = socket.create_connection((resolved_host, port), timeout)
+            except OSError:
+                DNSBlockWorkaround._demote(hostname, resolved_host)
+                raise
+            return sock, resolved_host
 
-        return resolved_host
+    async def prewarm(hostnames=DNS_PREWARM_HOSTNAMES):
+        """
+        Resolve `hostnames` in the background, so the first requests to them
+        don't have to wait on DNS.
+        """
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, DNSBlockWorkaround._resolve_all_with_workaround, hostname)
+              for hostname in hostnames),
+            return_exceptions=True,
+        )
+        return results
 
     def _is_blocked(hostname, address):
         is_blocked = False
@@ -230,26 +1120,60 @@ class DNSBlockWorkaround:
         return is_blocked
 
     class _HTTPConnection(http.client.HTTPConnection):
+        def __init__(self, *args, resolved_hosts=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            # Addresses the host has already been resolved to, if any.
+            self.resolved_hosts = resolved_hosts
+            self.address = None
+
         def connect(self):
-            host = DNSBlockWorkaround._resolve_with_workaround(self.host)
-            self.sock = socket.create_connection(
-                (host, self.port),
+            resolved_hosts = (self.resolved_hosts or
+                              DNSBlockWorkaround._resolve_all_with_workaround(self.host))
+            self.sock, self.address = DNSBlockWorkaround._create_connection(
+                self.host,
+                resolved_hosts,
+                self.port,
                 self.timeout,
             )
 
     class _HTTPSConnection(http.client.HTTPSConnection):
+        def __init__(self, *args, resolved_hosts=None, **kwargs):
+            # HTTPSConnection would otherwise create (and load the CA store
+            # into) a brand new default context for every connection.
+            kwargs.setdefault("context", DNSBlockWorkaround._get_ssl_context())
+            super().__init__(*args, **kwargs)
+            self.resolved_hosts = resolved_hosts
+            self.address = None
+
+        @property
+        def _tls_session_key(self):
+            return (self.host, self.address, self.port)
+
         def connect(self):
-            host = DNSBlockWorkaround._resolve_with_workaround(self.host)
-            sock = socket.create_connection(
-                (host, self.port),
+            resolved_hosts = (self.resolved_hosts or
+                              DNSBlockWorkaround._resolve_all_with_workaround(self.host))
+            sock, self.address = DNSBlockWorkaround._create_connection(
+                self.host,
+                resolved_hosts,
+                self.port,
                 self.timeout,
             )
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            context.verify_mode = ssl.CERT_REQUIRED
-            context.check_hostname = True
-            context.load_default_certs()
-            sock = context.wrap_socket(sock, server_hostname=self.host)
-            self.sock = sock
+            with _TRACER.span("tls_handshake", hostname=self.host) as span:
+                self.sock = self._context.wrap_socket(
+                    sock,
+                    server_hostname=self.host,
+                    session=DNSBlockWorkaround._tls_sessions.get(self._tls_session_key),
+                )
+                span["session_reused"] = self.sock.session_reused
+
+        def getresponse(self):
+            response = super().getresponse()
+            # TLS 1.3 servers only hand out a session after the handshake, so
+            # it's picked up once the server has sent something back.
+            session = getattr(self.sock, "session", None)
+            if session is not None:
+                DNSBlockWorkaround._tls_sessions[self._tls_session_key] = session
+            return response
 
     class _HTTPHandler(urllib.request.HTTPHandler):
         def http_open(self, req):
@@ -260,6 +1184,127 @@ class DNSBlockWorkaround:
             return self.do_open(DNSBlockWorkaround._HTTPSConnection, req)
 
 
+class HTTPConnectionPool:
+    """
+    Keeps HTTP(S) connections alive per host and resolved address after a
+    response has been read completely, so consecutive requests to the same
+    host (such as fetching the index and categories, or updating a batch of
+    plugins from raw.githubusercontent.com) reuse the connection instead of
+    paying for a new TCP and TLS handshake every time.
+
+    Errors are raised as `urllib.error.HTTPError` and `urllib.error.URLError`
+    so callers can handle them the same way as with `urllib.request.urlopen`.
+    """
+
+    _CONNECTION_CLASSES = {
+        "http": DNSBlockWorkaround._HTTPConnection,
+        "https": DNSBlockWorkaround._HTTPSConnection,
+    }
+    _REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, max_connections_per_host=MAX_PARALLEL_UPDATES, timeout=30, max_redirects=5):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def _get_connection(self, host, resolved_hosts):
+        with self._lock:
+            idle_connections = self._idle_connections.get(host)
+            if idle_connections:
+                return idle_connections.pop(), True
+        scheme, netloc, _ = host
+        connection_class = self._CONNECTION_CLASSES[scheme]
+        return connection_class(netloc, timeout=self.timeout, resolved_hosts=resolved_hosts), False
+
+    def _put_connection(self, host, connection):
+        with self._lock:
+            idle_connections = self._idle_connections.setdefault(host, [])
+            if len(idle_connections) < self.max_connections_per_host:
+                idle_connections.append(connection)
+                return
+        connection.close()
+
+    def _release(self, host, connection, response):
+        if response.isclosed() and not response.will_close:
+            self._put_connection(host, connection)
+        else:
+            connection.close()
+
+    def _send(self, host, resolved_hosts, path, headers):
+        connection, is_reused = self._get_connection(host, resolved_hosts)
+        try:
+            # Lasts until the response headers are in, the body is read by the caller.
+            with _TRACER.span("request", host=host[1], path=path,
+                              connection_reused=is_reused) as span:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                span["status"] = response.status
+            return connection, response
+        except (http.client.HTTPException, OSError) as e:
+            connection.close()
+            if is_reused:
+                # The server may have dropped the idle connection in the meantime.
+                return self._send(host, resolved_hosts, path, headers)
+            raise urllib.error.URLError(e)
+
+    def _open(self, url, headers):
+        for _ in range(self.max_redirects + 1):
+            split_url = urllib.parse.urlsplit(url)
+            try:
+                resolved_hosts = DNSBlockWorkaround._resolve_all_with_workaround(split_url.hostname)
+            except (OSError, LookupError, ValueError) as e:
+                raise urllib.error.URLError(e)
+            # Connections are pooled by the address currently preferred for the host.
+            host = (split_url.scheme, split_url.netloc, resolved_hosts[0])
+            path = split_url.path or "/"
+            if split_url.query:
+                path = f"{path}?{split_url.query}"
+            connection, response = self._send(host, resolved_hosts, path, headers)
+            if response.status in self._REDIRECT_STATUSES:
+                location = response.getheader("Location")
+                response.read()
+                self._release(host, connection, response)
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if not 200 <= response.status < 300:
+                response.read()
+                self._release(host, connection, response)
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, None)
+            return host, connection, response
+        raise urllib.error.URLError(f"Too many redirects while requesting {url}.")
+
+    @contextlib.contextmanager
+    def urlopen(self, request, headers={}):
+        if isinstance(request, urllib.request.Request):
+            url = request.full_url
+            # Header names are normalized the way `urllib.request.Request` does,
+            # so a header set in both places isn't sent twice.
+            headers = {
+                name.capitalize(): value
+                for name, value in (*headers.items(), *request.header_items())
+            }
+        else:
+            url = request
+        host, connection, response = self._open(url, headers)
+        try:
+            yield response
+        finally:
+            self._release(host, connection, response)
+
+    def close(self):
+        with self._lock:
+            for idle_connections in self._idle_connections.values():
+                for connection in idle_connections:
+                    connection.close()
+            self._idle_connections.clear()
+
+
+_CONNECTION_POOL = HTTPConnectionPool()
+
+
 class StartupTasks:
     def __init__(self):
         self.plugin_manager = PluginManager()
@@ -272,17 +1317,19 @@ class StartupTasks:
         plugin_manager_config = babase.app.config.setdefault("Community Plugin Manager", {})
         plugin_manager_config.setdefault("Custom Sources", [])
         installed_plugins = plugin_manager_config.setdefault("Installed Plugins", {})
+        plugin_file_names = get_plugin_file_names(PLUGIN_DIRECTORY)
         for plugin_name in tuple(installed_plugins.keys()):
-            plugin = PluginLocal(plugin_name)
-            if not plugin.is_installed:
+            if f"{plugin_name}.py" not in plugin_file_names:
                 del installed_plugins[plugin_name]
+        _LOCAL_PLUGIN_INDEX.prune(PLUGIN_DIRECTORY, plugin_file_names)
 
         # This order is the options will show up in Settings window.
         current_settings = {
             "Auto Update Plugin Manager": True,
             "Auto Update Plugins": True,
             "Auto Enable Plugins After Installation": True,
-            "Notify New Plugins": True
+            "Notify New Plugins": True,
+            "Record Timings": False,
         }
         settings = plugin_manager_config.setdefault("Settings", {})
 
@@ -291,9 +1338,10 @@ class StartupTasks:
                 current_settings[setting] = value
 
         plugin_manager_config["Settings"] = current_settings
+        _TRACER.enabled = current_settings["Record Timings"]
 
         if plugin_manager_config != existing_plugin_manager_config:
-            babase.app.config.commit()
+            commit_config()
 
     async def update_plugin_manager(self):
         if not babase.app.config["Community Plugin Manager"]["Settings"]["Auto Update Plugin Manager"]:
@@ -316,23 +1364,26 @@ class StartupTasks:
             return
         await self.plugin_manager.setup_index()
         all_plugins = await self.plugin_manager.categories["All"].get_plugins()
+        compatibility_index = self.plugin_manager.compatibility_index
         plugins_to_update = []
-        for plugin in all_plugins:
-            if plugin.is_installed and await plugin.get_local().is_enabled() and plugin.has_update():
-                plugins_to_update.append(plugin.update())
-        await asyncio.gather(*plugins_to_update)
-
-    @staticmethod
-    def _is_new_supported_plugin(plugin):
-        is_an_update = len(plugin.versions) > 1
+        for plugin in compatibility_index.filter(all_plugins):
+            if (plugin.is_installed and compatibility_index.has_update(plugin) and
+                    await plugin.get_local().is_enabled()):
+                plugins_to_update.append(plugin)
+        if not plugins_to_update:
+            return
+        updater = PluginUpdater(
+            max_parallel=babase.app.config["Community Plugin Manager"].get(
+                "Max Parallel Updates", MAX_PARALLEL_UPDATES),
+        )
+        updated, failed = await updater.update(plugins_to_update)
+        updater.notify(updated, failed)
+
+    def _is_new_supported_plugin(self, plugin):
+        is_an_update = len(plugin.info["versions"]) > 1
         if is_an_update:
             return False
-        try:
-            plugin.latest_compatible_version
-        except NoCompatibleVersion:
-            return False
-        else:
-            return True
+        return plugin in self.plugin_manager.compatibility_index
 
     async def notify_new_plugins(self):
         if not babase.app.config["Community Plugin Manager"]["Settings"]["Notify New Plugins"]:
@@ -344,7 +1395,7 @@ class StartupTasks:
             existing_num_of_plugins = babase.app.config["Community Plugin Manager"]["Existing Number of Plugins"]
         except KeyError:
             babase.app.config["Community Plugin Manager"]["Existing Number of Plugins"] = new_num_of_plugins
-            babase.app.config.commit()
+            commit_config()
             return
 
         def title_it(plug):
@@ -355,7 +1406,7 @@ class StartupTasks:
             all_plugins = await self.plugin_manager.categories["All"].get_plugins()
             new_supported_plugins = list(filter(self._is_new_supported_plugin, all_plugins))
             new_supported_plugins.sort(
-                key=lambda plugin: plugin.latest_compatible_version.released_on_date,
+                key=self.plugin_manager.compatibility_index.get_released_on_date,
                 reverse=True,
             )
             new_supported_plugins = new_supported_plugins[:new_plugin_count]
@@ -375,7 +1426,7 @@ class StartupTasks:
 
         if existing_num_of_plugins != new_num_of_plugins:
             babase.app.config["Community Plugin Manager"]["Existing Number of Plugins"] = new_num_of_plugins
-            babase.app.config.commit()
+            commit_config()
 
     async def execute(self):
         self.setup_config()
@@ -396,17 +1447,42 @@ class Category:
         self.request_headers = HEADERS
         self._metadata = _CACHE.get("categories", {}).get(meta_url, {}).get("metadata")
         self._plugins = _CACHE.get("categories", {}).get(meta_url, {}).get("plugins")
+        self._is_snapshot = False
+        self._search_index = None
+
+    @property
+    def download_url(self):
+        # Let's keep depending on the "main" branch for 3rd party sources
+        # even if we're using a different branch of plugin manager's repository.
+        return self.meta_url.format(content_type="raw", tag=self.tag)
+
+    def load_snapshot(self, metadata=None):
+        """
+        Load the metadata cached on disk by a previous launch (or `metadata`
+        taken from a cached catalog bundle) without making any network
+        requests. Snapshots are kept out of the global cache so they never
+        get mistaken for freshly fetched metadata.
+        """
+        if metadata is None:
+            content = _NETWORK_CACHE.get_content(self.download_url)
+            if content is None:
+                return False
+            try:
+                metadata = json.loads(content)
+            except json.decoder.JSONDecodeError:
+                return False
+        self._metadata = metadata
+        self._is_snapshot = True
+        return True
 
     async def fetch_metadata(self):
         if self._metadata is None:
-            # Let's keep depending on the "main" branch for 3rd party sources
-            # even if we're using a different branch of plugin manager's repository.
             request = urllib.request.Request(
-                self.meta_url.format(content_type="raw", tag=self.tag),
+                self.download_url,
                 headers=self.request_headers,
             )
-            response = await async_send_network_request(request)
-            self._metadata = json.loads(response.read())
+            content = await async_send_cached_network_request(request)
+            self._metadata = json.loads(content)
             self.set_category_global_cache("metadata", self._metadata)
         return self
 
@@ -456,6 +1532,8 @@ class Category:
         return self._plugins
 
     def set_category_global_cache(self, key, value):
+        if self._is_snapshot:
+            return
         if "categories" not in _CACHE:
             _CACHE["categories"] = {}
         if self.meta_url not in _CACHE["categories"]:
@@ -468,9 +1546,15 @@ class Category:
         except KeyError:
             pass
 
+    async def get_search_index(self):
+        if self._search_index is None:
+            self._search_index = PluginSearchIndex(await self.get_plugins())
+        return self._search_index
+
     def cleanup(self):
         self._metadata = None
         self._plugins.clear()
+        self._search_index = None
         self.unset_category_global_cache()
 
     async def refresh(self):
@@ -479,7 +1563,7 @@ class Category:
 
     def save(self):
         babase.app.config["Community Plugin Manager"]["Custom Sources"].append(self.meta_url)
-        babase.app.config.commit()
+        commit_config()
 
 
 class CategoryAll(Category):
@@ -490,6 +1574,115 @@ class CategoryAll(Category):
         self._plugins = plugins
 
 
+def parse_released_on(released_on):
+    # Much quicker than datetime.strptime, which matters for large catalogs.
+    day, month, year = released_on.split("-")
+    return datetime(int(year), int(month), int(day))
+
+
+class CompatibilityIndex:
+    """
+    The newest version of every plugin compatible with an API version, worked
+    out once whenever the catalog gets loaded. Looking plugins up here saves
+    walking through all of their versions (and raising NoCompatibleVersion for
+    the incompatible ones) every time the plugin list gets drawn.
+    """
+
+    def __init__(self, plugins, api_version):
+        self.api_version = api_version
+        # Maps a plugin to the number and release date of its newest compatible version.
+        self._entries = {}
+        for plugin in plugins:
+            for number, info in plugin.info["versions"].items():
+                if info["api_version"] == api_version:
+                    self._entries[plugin] = (number, parse_released_on(info["released_on"]))
+                    break
+
+    def __contains__(self, plugin):
+        return plugin in self._entries
+
+    def filter(self, plugins):
+        return [plugin for plugin in plugins if plugin in self._entries]
+
+    def get_version_number(self, plugin):
+        entry = self._entries.get(plugin)
+        return None if entry is None else entry[0]
+
+    def get_released_on_date(self, plugin):
+        entry = self._entries.get(plugin)
+        return None if entry is None else entry[1]
+
+    def has_update(self, plugin):
+        """
+        Whether an installed `plugin` has a newer compatible version available.
+        """
+        entry = self._entries.get(plugin)
+        return entry is not None and plugin.get_local().version != entry[0]
+
+
+class PluginSearchIndex:
+    """
+    Search fields of plugins normalized once when a category gets loaded, so
+    filtering doesn't have to lowercase every description and author name
+    again on each query. The matches of the last query are kept around, so a
+    query extending it (such as when another character gets typed) only needs
+    to look through the plugins that matched before.
+    """
+
+    # Ranks of how well a plugin matches a query; lower is better.
+    NAME_PREFIX_MATCH = 0
+    NAME_MATCH = 1
+    AUTHOR_MATCH = 2
+    DESCRIPTION_MATCH = 3
+
+    def __init__(self, plugins):
+        self._entries = tuple(
+            (
+                plugin,
+                plugin.name,
+                plugin.info["description"].lower(),
+                tuple(author["name"].lower() for author in plugin.info["authors"]),
+            )
+            for plugin in plugins
+        )
+        self._last_query = None
+        self._last_matches = ()
+
+    def _rank(self, entry, query, name_query):
+        plugin, name, description, authors = entry
+        if name.startswith(name_query):
+            return self.NAME_PREFIX_MATCH
+        if name_query in name:
+            return self.NAME_MATCH
+        for author in authors:
+            if query in author:
+                return self.AUTHOR_MATCH
+        if query in description:
+            return self.DESCRIPTION_MATCH
+        return None
+
+    def search(self, query):
+        """
+        Return a list of `(rank, plugin)` tuples for plugins matching `query`.
+        """
+        query = query.lower()
+        # This helps resolve "plugin name" to "plugin_name".
+        name_query = query.replace(" ", "_")
+        if self._last_query is not None and query.startswith(self._last_query):
+            # Anything that didn't match the shorter query can't match this one.
+            entries = (entry for rank, entry in self._last_matches)
+        else:
+            entries = self._entries
+        matches = []
+        for entry in entries:
+            rank = self._rank(entry, query, name_query)
+            if rank is not None:
+                matches.append((rank, entry))
+        self._last_query = query
+        self._last_matches = matches
+        return [(rank, entry[0]) for rank, entry in matches]
+
+
 class PluginLocal:
     def __init__(self, name):
         """
@@ -502,9 +1695,7 @@ class PluginLocal:
 
     def cleanup(self):
         self._content = None
-        self._api_version = None
-        self._entry_points = []
-        self._has_minigames = None
+        self._metadata = None
 
     @property
     def is_installed(self):
@@ -520,12 +1711,15 @@ class PluginLocal:
         return self
 
     async def uninstall(self):
-        if await self.has_minigames():
-            self.unload_minigames()
+        if await self.has_minigames() and not _IS_HEADLESS:
+            await self.unload_minigames()
+        # Keeps it around so that installing it again needs no download.
+        await self.add_to_store()
         try:
             os.remove(self.install_path)
         except FileNotFoundError:
             pass
+        _LOCAL_PLUGIN_INDEX.discard(self.install_path)
         try:
             del babase.app.config["Community Plugin Manager"]["Installed Plugins"][self.name]
         except KeyError:
@@ -542,13 +1736,23 @@ class PluginLocal:
             version = None
         return version
 
+    @property
+    def previous_version(self):
+        """
+        The version that was installed before the current one, which the
+        plugin can be rolled back to.
+        """
+        return (babase.app.config["Community Plugin Manager"]
+                ["Installed Plugins"].get(self.name, {}).get("previous_version"))
+
     def _get_content(self):
         with open(self.install_path, "rb") as fin:
             return fin.read()
 
     def _set_content(self, content):
-        with open(self.install_path, "wb") as fout:
-            fout.write(content)
+        # Never written to in place, since the file may be a hard link to one in
+        # the plugin store.
+        write_file_atomically(self.install_path, content)
 
     def has_settings(self):
         for plugin_entry_point, plugin_spec in bui.app.plugins.plugin_specs.items():
@@ -568,58 +1772,67 @@ class PluginLocal:
             self._content = await loop.run_in_executor(None, self._get_content)
         return self._content
 
+    async def get_metadata(self):
+        """
+        Return what's known about the installed plugin file from the local
+        plugin index, only reading the file if it changed since it was indexed.
+        """
+        if self._metadata is None:
+            try:
+                stat = os.stat(self.install_path)
+            except FileNotFoundError:
+                raise PluginNotInstalled("Plugin is not available locally.")
+            metadata = _LOCAL_PLUGIN_INDEX.get(self.install_path, stat)
+            if metadata is None:
+                # Not kept in `self._content`, since the set_content_* methods
+                # take that to mean the new content has already been written.
+                content = self._content or await loop.run_in_executor(None, self._get_content)
+                metadata = _LOCAL_PLUGIN_INDEX.set(self.install_path, stat, content)
+            self._metadata = metadata
+        return self._metadata
+
+    def _index_content(self, content):
+        # We just wrote the file ourselves, so there's no need to read it back
+        # the next time its metadata is asked for.
+        try:
+            stat = os.stat(self.install_path)
+        except OSError:
+            return
+        self._metadata = _LOCAL_PLUGIN_INDEX.set(self.install_path, stat, bytes(content))
+
     async def get_api_version(self):
-        if self._api_version is None:
-            content = await self.get_content()
-            self._api_version = REGEXP["plugin_api_version"].search(content).group()
-        return self._api_version
+        api_version = (await self.get_metadata())["api_version"]
+        return None if api_version is None else api_version.encode("utf-8")
 
     async def get_entry_points(self):
-        if not self._entry_points:
-            content = await self.get_content()
-            groups = REGEXP["plugin_entry_points"].findall(content)
-            # Actual entry points are stored in the last index inside the matching groups.
-            entry_points = tuple(f"{self.name}.{group[-1].decode('utf-8')}" for group in groups)
-            self._entry_points = entry_points
-        return self._entry_points
+        return tuple(
+            f"{self.name}.{entry_point}"
+            for entry_point in (await self.get_metadata())["entry_points"]
+        )
+
+    async def get_minigames(self):
+        return tuple(
+            f"{self.name}.{minigame}"
+            for minigame in (await self.get_metadata())["minigames"]
+        )
 
     async def has_minigames(self):
-        if self._has_minigames is None:
-            content = await self.get_content()
-            self._has_minigames = REGEXP["minigames"].search(content) is not None
-        return self._has_minigames
+        return len((await self.get_metadata())["minigames"]) > 0
+
+    async def get_md5sum(self):
+        return (await self.get_metadata())["md5sum"]
 
     async def has_plugins(self):
         entry_points = await self.get_entry_points()
         return len(entry_points) > 0
 
-    def load_minigames(self):
-        scanner = babase._meta.DirectoryScan(paths="")
-        directory, module = self.install_path.rsplit(os.path.sep, 1)
-        scanner._scan_module(
-            pathlib.Path(directory),
-            pathlib.Path(module),
-        )
-        scanned_results = set(babase.app.meta.scanresults.exports["bascenev1.GameActivity"])
-        for game in scanner.results.exports["bascenev1.GameActivity"]:
-            if game not in scanned_results:
-                bui.screenmessage(f"{game} minigame loaded")
-                babase.app.meta.scanresults.exports["bascenev1.GameActivity"].append(game)
-
-    def unload_minigames(self):
-        scanner = babase._meta.DirectoryScan(paths="")
-        directory, module = self.install_path.rsplit(os.path.sep, 1)
-        scanner._scan_module(
-            pathlib.Path(directory),
-            pathlib.Path(module),
-        )
-        new_scanned_results_games = []
-        for game in babase.app.meta.scanresults.exports["bascenev1.GameActivity"]:
-            if game in scanner.results.exports["bascenev1.GameActivity"]:
-                bui.screenmessage(f"{game} minigame unloaded")
-            else:
-                new_scanned_results_games.append(game)
-        babase.app.meta.scanresults.exports["bascenev1.GameActivity"] = new_scanned_results_games
+    async def load_minigames(self):
+        for game in _MINIGAME_REGISTRY.register(await self.get_minigames()):
+            bui.screenmessage(f"{game} minigame loaded")
+
+    async def unload_minigames(self):
+        for game in _MINIGAME_REGISTRY.unregister(await self.get_minigames()):
+            bui.screenmessage(f"{game} minigame unloaded")
 
     async def is_enabled(self):
         """
@@ -637,12 +1850,15 @@ class PluginLocal:
             if entry_point not in babase.app.config["Plugins"]:
                 babase.app.config["Plugins"][entry_point] = {}
             babase.app.config["Plugins"][entry_point]["enabled"] = True
+            if _IS_HEADLESS:
+                # The game loads enabled plugins by itself once it's launched.
+                continue
             plugin_spec = bui.app.plugins.plugin_specs.get(entry_point)
             if plugin_spec not in bui.app.plugins.active_plugins:
                 self.load_plugin(entry_point)
                 bui.screenmessage(f"{entry_point} loaded")
-        if await self.has_minigames():
-            self.load_minigames()
+        if await self.has_minigames() and not _IS_HEADLESS:
+            await self.load_minigames()
         self.save()
 
     def load_plugin(self, entry_point):
@@ -664,28 +1880,71 @@ class PluginLocal:
 
     def set_version(self, version):
         app = babase.app
-        app.config["Community Plugin Manager"]["Installed Plugins"][self.name]["version"] = version
+        plugin_config = app.config["Community Plugin Manager"]["Installed Plugins"][self.name]
+        current_version = plugin_config.get("version")
+        if current_version is not None and current_version != version:
+            plugin_config["previous_version"] = current_version
+        plugin_config["version"] = version
         return self
 
+    async def add_to_store(self):
+        if not self.is_installed:
+            return
+        md5sum = await self.get_md5sum()
+        await loop.run_in_executor(None, _PLUGIN_STORE.add, md5sum, self.install_path)
+
     async def set_content(self, content):
         if not self._content:
 
             await loop.run_in_executor(None, self._set_content, content)
             self._content = content
+            self._index_content(content)
         return self
 
-    async def set_content_from_network_response(self, request, md5sum=None, retries=3):
+    async def set_content_from_network_response(self, request, md5sum=None, retries=3,
+                                                executor=None):
         if not self._content:
             self._content = await async_stream_network_response_to_file(
                 request,
                 self.install_path,
                 md5sum=md5sum,
                 retries=retries,
+                executor=executor,
+            )
+            self._index_content(self._content)
+        return self._content
+
+    async def set_content_from_store(self, md5sum, executor=None):
+        """
+        Install the plugin file with `md5sum` from the plugin store. Returns
+        False if it isn't in the store.
+        """
+        if not self._content:
+            content = await loop.run_in_executor(
+                executor,
+                _PLUGIN_STORE.materialize,
+                md5sum,
+                self.install_path,
+            )
+            if content is None:
+                return False
+            self._content = content
+            self._index_content(self._content)
+        return True
+
+    async def set_content_from_patch(self, request, md5sum, executor=None):
+        if not self._content:
+            self._content = await async_patch_file(
+                request,
+                self.install_path,
+                md5sum,
+                executor=executor,
             )
+            self._index_content(self._content)
         return self._content
 
     def save(self):
-        babase.app.config.commit()
+        commit_config()
         return self
 
 
@@ -697,6 +1956,8 @@ class PluginVersion:
         self.released_on = info["released_on"]
         self.commit_sha = info["commit_sha"]
         self.md5sum = info["md5sum"]
+        # Versions of this plugin that have a patch available to update to this version.
+        self.patches = info.get("patches", ())
 
         self.download_url = self.plugin.url.format(content_type="raw", tag=tag)
         self.view_url = self.plugin.url.format(content_type="blob", tag=tag)
@@ -710,34 +1971,91 @@ class PluginVersion:
 
     @property
     def released_on_date(self):
-        return datetime.strptime(self.released_on, "%d-%m-%Y")
+        return parse_released_on(self.released_on)
 
-    async def _download(self, retries=3):
-        local_plugin = self.plugin.create_local()
-        await local_plugin.set_content_from_network_response(
-            self.download_url,
-            md5sum=self.md5sum,
-            retries=retries,
+    def get_patch_url(self, from_version):
+        plugins_base_url = self.plugin.url[:-len(f"{self.plugin.name}.py")]
+        return (
+            f"{plugins_base_url}patches/{self.plugin.name}/{from_version}-{self.number}.json"
+            .format(content_type="raw", tag=self.plugin.tag)
         )
-        local_plugin.set_version(self.number)
-        local_plugin.save()
-        return local_plugin
 
-    async def install(self, suppress_screenmessage=False):
+    async def _patch(self, local_plugin, executor=None):
+        """
+        Try updating the installed plugin using a patch from its currently
+        installed version, which is much smaller than the whole plugin.
+        Returns False if no usable patch is available.
+        """
+        if not local_plugin.is_installed or local_plugin.version not in self.patches:
+            return False
+        installed_version_info = self.plugin.info["versions"].get(local_plugin.version)
+        if (installed_version_info is not None and
+                await local_plugin.get_md5sum() != installed_version_info["md5sum"]):
+            # The installed file was modified locally, so no patch would apply to it.
+            return False
         try:
-            local_plugin = await self._download()
-        except MD5CheckSumFailed:
-            if not suppress_screenmessage:
-                bui.screenmessage(
-                    f"{self.plugin.name} failed MD5 checksum during installation", color=(1, 0, 0))
+            await local_plugin.set_content_from_patch(
+                self.get_patch_url(local_plugin.version),
+                self.md5sum,
+                executor=executor,
+            )
+        except (MD5CheckSumFailed, OSError, ValueError, KeyError, TypeError):
+            # Falling back to downloading the whole plugin is always an option.
             return False
-        else:
+        return True
+
+    async def _download(self, retries=3, executor=None):
+        with _TRACER.span("install", plugin=self.plugin.name, version=self.number,
+                          source="store") as span:
+            local_plugin = self.plugin.create_local()
+            # Keep the version being replaced, so that it can be rolled back to.
+            await local_plugin.add_to_store()
+            if (self.md5sum is None or
+                    not await local_plugin.set_content_from_store(self.md5sum, executor=executor)):
+                span["source"] = "patch"
+                if not await self._patch(local_plugin, executor=executor):
+                    span["source"] = "download"
+                    await local_plugin.set_content_from_network_response(
+                        self.download_url,
+                        md5sum=self.md5sum,
+                        retries=retries,
+                        executor=executor,
+                    )
+                if self.md5sum is not None:
+                    await loop.run_in_executor(
+                        executor,
+                        _PLUGIN_STORE.add,
+                        self.md5sum,
+                        local_plugin.install_path,
+                    )
+        return local_plugin
+
+    async def finish_install(self, local_plugin, suppress_screenmessage=False):
+        """
+        Record the downloaded `local_plugin` as installed at this version and
+        enable it if the settings ask for it.
+        """
+        # The installed version and the plugin getting enabled are committed together.
+        with _CONFIG_COMMITTER.batch():
+            local_plugin.set_version(self.number)
+            local_plugin.save()
             if not suppress_screenmessage:
                 bui.screenmessage(f"{self.plugin.name} installed", color=(0, 1, 0))
             check = babase.app.config["Community Plugin Manager"]["Settings"]
             if check["Auto Enable Plugins After Installation"]:
                 await local_plugin.enable()
-            return True
+
+    async def install(self, suppress_screenmessage=False, executor=None):
+        try:
+            local_plugin = await self._download(executor=executor)
+        except MD5CheckSumFailed:
+            if not suppress_screenmessage:
+                bui.screenmessage(
+                    f"{self.plugin.name} failed MD5 checksum during installation",
+                    color=(1, 0, 0))
+            return False
+        await self.finish_install(local_plugin, suppress_screenmessage)
+        return True
 
 
 class Plugin:
@@ -830,6 +2148,33 @@ class Plugin:
         await self.get_local().uninstall()
         bui.screenmessage(f"{self.name} uninstalled", color=(0.9, 1, 0))
 
+    def get_previous_version(self):
+        """
+        Return the version that was installed before the current one, or None
+        if there's none that's compatible with the game.
+        """
+        number = self.get_local().previous_version
+        info = self.info["versions"].get(number)
+        if info is None or info["api_version"] != _app_api_version:
+            return None
+        return PluginVersion(
+            self,
+            (number, info),
+            tag=self.tag if self.latest_version.number == number else info["commit_sha"],
+        )
+
+    async def rollback(self):
+        previous_version = self.get_previous_version()
+        if await previous_version.install(suppress_screenmessage=True):
+            bui.screenmessage(f"{self.name} rolled back to {previous_version.number}",
+                              color=(0, 1, 0))
+            return True
+        bui.screenmessage(f"{self.name} failed MD5 checksum while rolling back to "
+                          f"{previous_version.number}",
+                          color=(1, 0, 0))
+        bui.getsound('error').play()
+        return False
+
     def has_update(self):
         try:
             latest_compatible_version = self.latest_compatible_version
@@ -850,41 +2195,218 @@ class Plugin:
             bui.getsound('error').play()
 
 
+class PluginUpdater:
+    """
+    Updates a batch of plugins with at most `max_parallel` of them being
+    downloaded at once, on a dedicated set of worker threads so the default
+    executor stays available for everything else. Downloads that fail due to
+    network errors are retried with an exponential backoff, and the outcome
+    is reported as a single summary once the whole batch is done.
+    """
+
+    def __init__(self, max_parallel=MAX_PARALLEL_UPDATES, retries=3, backoff=1):
+        self.max_parallel = max(1, max_parallel)
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _download_plugin(self, plugin, semaphore, executor):
+        """
+        Download the latest compatible version of `plugin`, returning the
+        local plugin it was downloaded to or None if it failed.
+        """
+        async with semaphore:
+            version = plugin.latest_compatible_version
+            for attempt in range(self.retries + 1):
+                try:
+                    return await version._download(executor=executor)
+                except MD5CheckSumFailed:
+                    return None
+                except urllib.error.HTTPError as e:
+                    if e.code < 500:
+                        # Retrying won't make a missing file appear.
+                        return None
+                except (http.client.HTTPException, OSError):
+                    # Such as the connection dropping halfway through the file.
+                    pass
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+            return None
+
+    async def update(self, plugins):
+        """
+        Update the given plugins to their latest compatible versions. Returns
+        a tuple of the plugins that were updated and those that failed.
+        """
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_parallel,
+            thread_name_prefix="plugin_manager_updater",
+        )
+        try:
+            # One plugin failing in an unexpected way mustn't keep the ones
+            # already downloaded from being recorded as installed.
+            results = await asyncio.gather(*(
+                self._download_plugin(plugin, semaphore, executor)
+                for plugin in plugins
+            ), return_exceptions=True)
+        finally:
+            executor.shutdown(wait=False)
+        local_plugins = []
+        for plugin, result in zip(plugins, results):
+            if isinstance(result, BaseException):
+                logging.error('Failed to download %s.', plugin.name, exc_info=result)
+                result = None
+            local_plugins.append(result)
+        # Only now that the downloads are done, so that the config is
+        # written once without being held back for as long as they take.
+        with _CONFIG_COMMITTER.batch():
+            for index, (plugin, local_plugin) in enumerate(zip(plugins, local_plugins)):
+                if local_plugin is None:
+                    continue
+                try:
+                    await plugin.latest_compatible_version.finish_install(
+                        local_plugin, suppress_screenmessage=True)
+                except Exception:
+                    logging.exception('Failed to install %s.', plugin.name)
+                    local_plugins[index] = None
+        updated = [plugin for plugin, local_plugin in zip(plugins, local_plugins)
+                   if local_plugin is not None]
+        failed = [plugin for plugin, local_plugin in zip(plugins, local_plugins)
+                  if local_plugin is None]
+        return updated, failed
+
+    def notify(self, updated, failed, show_max_names=3):
+        def format_names(plugins):
+            names = ", ".join(plugin.name.replace("_", " ").title()
+                              for plugin in plugins[:show_max_names])
+            if len(plugins) > show_max_names:
+                names += f" and +{len(plugins) - show_max_names}"
+            return names
+
+        if updated:
+            plural = "s" if len(updated) > 1 else ""
+            bui.screenmessage(f"Updated {len(updated)} plugin{plural} ({format_names(updated)})",
+                              color=(0, 1, 0))
+            bui.getsound('shieldUp').play()
+        if failed:
+            plural = "s" if len(failed) > 1 else ""
+            bui.screenmessage(f"Failed to update {len(failed)} plugin{plural} "
+                              f"({format_names(failed)})", color=(1, 0, 0))
+            bui.getsound('error').play()
+
+
 class PluginManager:
     def __init__(self):
         self.request_headers = HEADERS
         self._index = _CACHE.get("index", {})
         self._changelog = _CACHE.get("changelog", {})
         self.categories = {}
+        self.compatibility_index = CompatibilityIndex((), _app_api_version)
         self.module_path = sys.modules[__name__].__file__
-        self._index_setup_in_progress = False
-        self._changelog_setup_in_progress = False
 
-    async def get_index(self):
-        if not self._index:
+    @property
+    def index_url(self):
+        return INDEX_META.format(
+            repository_url=REPOSITORY_URL,
+            content_type="raw",
+            tag=CURRENT_TAG
+        )
+
+    @property
+    def catalog_url(self):
+        return CATALOG_META.format(
+            repository_url=REPOSITORY_URL,
+            content_type="raw",
+            tag=CURRENT_TAG
+        )
+
+    async def get_catalog(self):
+        """
+        Fetch the catalog bundle, which holds the index and the metadata of all
+        official categories, in a single request. Returns None if the bundle
+        isn't available, in which case they need to be fetched one by one.
+        """
+        request = urllib.request.Request(
+            self.catalog_url,
+            headers=self.request_headers,
+        )
+        try:
+            content = await async_send_cached_network_request(request, decode=decode_gzipped_text)
+            return json.loads(content)
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def set_catalog_global_cache(self, catalog):
+        for meta_url, metadata in catalog["categories"].items():
+            Category(meta_url).set_category_global_cache("metadata", metadata)
+
+    async def _fetch_index(self):
+        catalog = await self.get_catalog()
+        if catalog is None:
             request = urllib.request.Request(
-                INDEX_META.format(
-                    repository_url=REPOSITORY_URL,
-                    content_type="raw",
-                    tag=CURRENT_TAG
-                ),
+                self.index_url,
                 headers=self.request_headers,
             )
-            response = await async_send_network_request(request)
-            index = json.loads(response.read())
-            self.set_index_global_cache(index)
-            self._index = index
+            content = await async_send_cached_network_request(request)
+            index = json.loads(content)
+        else:
+            index = catalog["index"]
+            self.set_catalog_global_cache(catalog)
+        self.set_index_global_cache(index)
+        return index
+
+    async def get_index(self):
+        if not self._index:
+            # Every plugin manager instance fetching the index at the same time
+            # (e.g. startup tasks and the window) shares a single fetch.
+            self._index = await _SINGLE_FLIGHT.run(self.catalog_url, self._fetch_index)
         return self._index
 
     async def setup_index(self):
-        while self._index_setup_in_progress:
-            # Avoid making multiple network calls to the same resource in parallel.
-            # Rather wait for the previous network call to complete.
-            await asyncio.sleep(0.1)
-        self._index_setup_in_progress = not bool(self._index)
         index = await self.get_index()
         await self.setup_plugin_categories(index)
-        self._index_setup_in_progress = False
+
+    async def setup_index_from_snapshot(self):
+        """
+        Set up the index and categories from the copies cached on disk by a
+        previous launch, without waiting on the network. Returns whether a
+        complete snapshot was available. Nothing is set up if the index has
+        already been fetched during this session.
+        """
+        if self._index:
+            return False
+        catalog_content = _NETWORK_CACHE.get_content(self.catalog_url)
+        content = _NETWORK_CACHE.get_content(self.index_url)
+        try:
+            if catalog_content is not None:
+                catalog = json.loads(catalog_content)
+                index, catalog_categories = catalog["index"], catalog["categories"]
+            elif content is not None:
+                index, catalog_categories = json.loads(content), {}
+            else:
+                return False
+        except (json.decoder.JSONDecodeError, KeyError):
+            return False
+        categories = []
+        for meta_url, tag in self.get_category_sources(index):
+            category = Category(meta_url, tag=tag)
+            if not category.load_snapshot(catalog_categories.get(meta_url)):
+                return False
+            categories.append(category)
+        self._index = index
+        await self.set_categories(categories)
+        return True
+
+    async def revalidate_index(self):
+        """
+        Fetch the index and categories again and swap them in once they're
+        ready, leaving the current ones usable in the meantime.
+        """
+        plugin_manager = PluginManager()
+        await plugin_manager.setup_index()
+        self._index = plugin_manager._index
+        self.categories = plugin_manager.categories
+        self.compatibility_index = plugin_manager.compatibility_index
 
     async def get_changelog(self) -> list[str, bool]:
         requested = False
@@ -895,19 +2417,13 @@ class PluginManager:
                 tag=CURRENT_TAG
             ),
                 headers=self.request_headers)
-            response = await async_send_network_request(request)
-            self._changelog = response.read().decode()
+            self._changelog = await async_send_cached_network_request(request)
             requested = True
         return [self._changelog, requested]
 
     async def setup_changelog(self, version=None) -> None:
         if version is None:
             version = PLUGIN_MANAGER_VERSION
-        while self._changelog_setup_in_progress:
-            # Avoid making multiple network calls to the same resource in parallel.
-            # Rather wait for the previous network call to complete.
-            await asyncio.sleep(0.1)
-        self._changelog_setup_in_progress = not bool(self._changelog)
         try:
             full_changelog = await self.get_changelog()
             # check if the changelog was requested
@@ -932,18 +2448,12 @@ class PluginManager:
         except urllib.error.URLError:
             changelog = {'released_on': ' (Not Provided)',
                          'info': 'Could not get ChangeLog due to Internet Issues.'}
+        self._changelog = changelog
         self.set_changelog_global_cache(changelog)
-        self._changelog_setup_in_progress = False
-
-    async def setup_plugin_categories(self, plugin_index):
-        # A hack to have the "All" category show at the top.
-        self.categories["All"] = None
 
-        requests = []
+    def get_category_sources(self, plugin_index):
         for meta_url in plugin_index["categories"]:
-            category = Category(meta_url)
-            request = category.fetch_metadata()
-            requests.append(request)
+            yield meta_url, CURRENT_TAG
         for source in babase.app.config["Community Plugin Manager"]["Custom Sources"]:
             source_splits = source.split("@", maxsplit=1)
             if len(source_splits) == 1:
@@ -955,16 +2465,27 @@ class PluginManager:
                 plugin_index["external_source_url"],
                 repository=source_repo,
             )
-            category = Category(meta_url, tag=source_tag)
+            yield meta_url, source_tag
+
+    async def setup_plugin_categories(self, plugin_index):
+        requests = []
+        for meta_url, tag in self.get_category_sources(plugin_index):
+            category = Category(meta_url, tag=tag)
             request = category.fetch_metadata()
             requests.append(request)
         categories = await asyncio.gather(*requests)
+        await self.set_categories(categories)
+
+    async def set_categories(self, categories):
+        # A hack to have the "All" category show at the top.
+        self.categories["All"] = None
 
         all_plugins = []
         for category in categories:
             self.categories[await category.get_name()] = category
             all_plugins.extend(await category.get_plugins())
         self.categories["All"] = CategoryAll(plugins=all_plugins)
+        self.compatibility_index = CompatibilityIndex(all_plugins, _app_api_version)
 
     def cleanup(self):
         for category in self.categories.values():
@@ -1133,6 +2654,128 @@ class ChangelogWindow(popup.PopupWindow):
         bui.containerwidget(edit=self._root_widget, transition='out_scale')
 
 
+class TimingsWindow(popup.PopupWindow):
+    """
+    Shows a summary of the timings recorded while the "Record Timings" setting
+    is enabled, and saves all of them to a JSON file that can be shared when
+    reporting slow loads.
+    """
+
+    def __init__(self, origin_widget):
+        self.scale_origin = origin_widget.get_screen_space_center()
+        bui.getsound('swish').play()
+        s = 1.65 if _uiscale() is babase.UIScale.SMALL else 1.39 if _uiscale() is babase.UIScale.MEDIUM else 1.67
+        width = 400 * s
+        height = width * 0.6
+        color = (1, 1, 1)
+        text_scale = 0.7 * s
+        b_text_color = (0.8, 0.8, 0.85)
+
+        self._root_widget = bui.containerwidget(
+            size=(width, height),
+            on_outside_click_call=self._back,
+            transition='in_scale',
+            scale=(1.5 if _uiscale() is babase.UIScale.SMALL else 1.5 if _uiscale()
+                   is babase.UIScale.MEDIUM else 1.0),
+            scale_origin_stack_offset=self.scale_origin
+        )
+
+        _add_popup(self)
+
+        bui.textwidget(
+            parent=self._root_widget,
+            position=(width * 0.49, height * 0.89),
+            size=(0, 0),
+            h_align='center',
+            v_align='center',
+            text='Timings',
+            scale=text_scale * 1.25,
+            color=bui.app.ui_v1.title_color,
+            maxwidth=width * 0.9
+        )
+
+        back_button = bui.buttonwidget(
+            parent=self._root_widget,
+            position=(width * 0.1, height * 0.83),
+            size=(60, 60),
+            scale=0.8,
+            label=babase.charstr(babase.SpecialChar.BACK),
+            button_type='backSmall',
+            on_activate_call=self._back
+        )
+
+        bui.containerwidget(edit=self._root_widget, cancel_button=back_button)
+
+        bui.buttonwidget(
+            parent=self._root_widget,
+            position=(width * 0.62, height * 0.83),
+            size=(80, 30),
+            textcolor=b_text_color,
+            button_type='square',
+            label='Clear',
+            on_activate_call=self.clear
+        )
+        bui.buttonwidget(
+            parent=self._root_widget,
+            position=(width * 0.78, height * 0.83),
+            size=(80, 30),
+            textcolor=b_text_color,
+            button_type='square',
+            label='Save',
+            on_activate_call=self.save
+        )
+
+        summary = _TRACER.summarize()
+        if summary:
+            lines = [
+                f"{name}: {totals['count']}x, {totals['total_ms']:.0f} ms total, "
+                f"{totals['max_ms']:.0f} ms max"
+                + (f", {totals['bytes'] / 1024:.1f} KB" if totals['bytes'] else "")
+                + (f", {totals['errors']} failed" if totals['errors'] else "")
+                for name, totals in summary.items()
+            ]
+            h_align = 'left'
+            x = width * 0.08
+        else:
+            lines = ["Nothing recorded yet"]
+            h_align = 'center'
+            x = width * 0.49
+
+        loop_height = height * 0.72
+        for line in lines:
+            bui.textwidget(
+                parent=self._root_widget,
+                position=(x, loop_height),
+                size=(0, 0),
+                h_align=h_align,
+                v_align='top',
+                text=line,
+                scale=text_scale * 0.7,
+                color=color,
+                maxwidth=width * 0.85
+            )
+            loop_height -= 25
+
+    def clear(self):
+        _TRACER.clear()
+        self._back()
+
+    def save(self):
+        try:
+            path = _TRACER.dump()
+        except OSError as e:
+            bui.screenmessage(f"Couldn't save timings: {e}", color=(1, 0, 0))
+            bui.getsound('error').play()
+        else:
+            bui.screenmessage(f"Timings saved to {path}", color=(0, 1, 0))
+            bui.getsound('gunCocking').play()
+
+    def _back(self) -> None:
+        bui.getsound('swish').play()
+        _remove_popup(self)
+        bui.containerwidget(edit=self._root_widget, transition='out_scale')
+
+
 class AuthorsWindow(popup.PopupWindow):
     def __init__(self, authors_info, origin_widget):
         self.authors_info = authors_info
@@ -1375,6 +3018,7 @@ class PluginWindow(popup.PopupWindow):
 
         to_draw_button1 = True
         to_draw_button4 = False
+        to_draw_rollback_button = False
         if self.plugin.is_installed:
             self.local_plugin = self.plugin.get_local()
             if not await self.local_plugin.has_plugins():
@@ -1391,6 +3035,7 @@ class PluginWindow(popup.PopupWindow):
                     button1_action = self.enable
             button2_label = "Uninstall"
             button2_action = self.uninstall
+            to_draw_rollback_button = self.plugin.get_previous_version() is not None
             has_update = self.plugin.has_update()
             if has_update:
                 button3_label = "Update"
@@ -1552,6 +3197,39 @@ class PluginWindow(popup.PopupWindow):
                 draw_controller=settings_button
             )
 
+        if to_draw_rollback_button:
+            rollback_pos_x = 110 if to_draw_button4 else 60
+            rollback_pos_y = (100 if _uiscale() is babase.UIScale.SMALL else
+                              110 if _uiscale() is babase.UIScale.MEDIUM else 120)
+            rollback_button = bui.buttonwidget(
+                parent=self._root_widget,
+                autoselect=True,
+                position=(rollback_pos_x, rollback_pos_y),
+                size=(40, 40),
+                button_type="square",
+                label="",
+                color=(0.6, 0.53, 0.63),
+                on_activate_call=self.rollback
+            )
+            bui.imagewidget(
+                parent=self._root_widget,
+                position=(rollback_pos_x, rollback_pos_y),
+                size=(40, 40),
+                color=(0.8, 0.95, 1),
+                texture=bui.gettexture("replayIcon"),
+                draw_controller=rollback_button
+            )
+            bui.textwidget(
+                parent=self._root_widget,
+                position=(rollback_pos_x - 3, rollback_pos_y + 12),
+                text=f"v{self.plugin.get_previous_version().number}",
+                size=(10, 10),
+                draw_controller=rollback_button,
+                color=(1, 1, 1, 1),
+                rotate=25,
+                scale=0.45
+            )
+
     def _ok(self) -> None:
         _remove_popup(self)
         bui.containerwidget(edit=self._root_widget, transition='out_scale')
@@ -1626,6 +3304,11 @@ class PluginWindow(popup.PopupWindow):
         await self.plugin.update()
         bui.getsound('shieldUp').play()
 
+    @button
+    async def rollback(self):
+        if await self.plugin.rollback():
+            bui.getsound('shieldDown').play()
+
 
 class PluginCustomSourcesWindow(popup.PopupWindow):
     def __init__(self, origin_widget):
@@ -1793,7 +3476,7 @@ class PluginCustomSourcesWindow(popup.PopupWindow):
             bui.getsound('error').play()
             return
         babase.app.config["Community Plugin Manager"]["Custom Sources"].append(source)
-        babase.app.config.commit()
+        commit_config()
         bui.screenmessage("Plugin source added; Refresh plugin list to see changes",
                           color=(0, 1, 0))
         bui.getsound('cashRegister2').play()
@@ -1803,7 +3486,7 @@ class PluginCustomSourcesWindow(popup.PopupWindow):
         if self.selected_source is None:
             return
         babase.app.config["Community Plugin Manager"]["Custom Sources"].remove(self.selected_source)
-        babase.app.config.commit()
+        commit_config()
         bui.screenmessage("Plugin source deleted; Refresh plugin list to see changes",
                           color=(0.9, 1, 0))
         bui.getsound('shieldDown').play()
@@ -1857,6 +3540,11 @@ class PluginCategoryWindow(popup.PopupMenuWindow):
 
 
 class PluginManagerWindow(bui.MainWindow):
+    # Rows drawn right away are enough to fill the visible part of the plugin
+    # list with a little to spare; the rest are drawn in batches afterwards.
+    VISIBLE_PLUGIN_NAME_ROWS = 15
+    PLUGIN_NAME_ROWS_PER_BATCH = 20
+
     def __init__(
         self,
         transition: str = "in_right",
@@ -1866,6 +3554,13 @@ class PluginManagerWindow(bui.MainWindow):
         self.category_selection_button = None
         self.selected_category = 'All'
         self.plugins_in_current_view = {}
+        self._plugin_name_rows = []
+        # Bumped by every plugin list draw, so older draws still in progress
+        # know to stop instead of drawing over the newer one.
+        self._draw_generation = 0
+        self._filter_widget = None
+        self._last_filter_text = ""
+        self._last_filter_plugins = []
         self.selected_alphabet_order = 'a_z'
         self.alphabet_order_selection_button = None
         global open_popups
@@ -1994,7 +3689,6 @@ class PluginManagerWindow(bui.MainWindow):
                 )
             except:
                 pass
-            self.plugin_manager._index_setup_in_progress = False
         except RuntimeError:
             # User probably went back before a bui.Window could finish loading.
             pass
@@ -2013,14 +3707,31 @@ class PluginManagerWindow(bui.MainWindow):
         self.draw_refresh_icon()
         self.draw_settings_icon()
         with self.exception_handler():
-            await self.plugin_manager.setup_changelog()
+            await asyncio.gather(
+                self.plugin_manager.setup_changelog(),
+                self.setup_index(),
+            )
+
+    async def setup_index(self):
+        if await self.plugin_manager.setup_index_from_snapshot():
+            # Show the plugins known from the previous launch right away, and
+            # apply whatever changed once the network round-trip completes.
+            await self.show_index()
+            await self.plugin_manager.revalidate_index()
+        else:
             await self.plugin_manager.setup_index()
-            self.spin()
-            try:
-                bui.textwidget(edit=self._plugin_manager_status_text, text="")
-            except:
-                pass
-            await self.select_category("All")
+        await self.show_index()
+
+    async def show_index(self):
+        self.spin()
+        try:
+            bui.textwidget(edit=self._plugin_manager_status_text, text="")
+        except:
+            pass
+        if self.selected_category not in self.plugin_manager.categories:
+            if self.selected_category != "Installed":
+                self.selected_category = "All"
+        await self.select_category(self.selected_category)
 
     def draw_plugins_scroll_bar(self):
         scroll_size_x = (515 if _uiscale() is babase.UIScale.SMALL else
@@ -2094,11 +3805,11 @@ class PluginManagerWindow(bui.MainWindow):
         bui.buttonwidget(edit=self.alphabet_order_selection_button,
                          label=('Z - A' if self.selected_alphabet_order == 'z_a' else 'A - Z')
                          )
-        filter_text = bui.textwidget(parent=self._root_widget, query=self._filter_widget)
         if self.plugin_manager.categories != {}:
             if self.plugin_manager.categories['All'] is not None:
                 await self.draw_plugin_names(
-                    self.selected_category, search_term=filter_text, refresh=True, order=self.selected_alphabet_order
+                    self.selected_category, search_term=self.get_filter_text(), refresh=True,
+                    order=self.selected_alphabet_order
                 )
 
     def draw_search_bar(self):
@@ -2148,22 +3859,65 @@ class PluginManagerWindow(bui.MainWindow):
         self._last_filter_text = ""
         self._last_filter_plugins = []
 
-        loop.create_task(self.process_search_term())
+        search_task = loop.create_task(self.process_search_term())
+        # Stop watching for search terms as soon as the window goes away.
+        self._filter_widget.add_delete_callback(search_task.cancel)
+
+    def get_filter_text(self):
+        if self._filter_widget is None or not self._filter_widget.exists():
+            return self._last_filter_text
+        return bui.textwidget(parent=self._root_widget, query=self._filter_widget).lower()
 
     async def process_search_term(self):
-        while True:
-            await asyncio.sleep(0.2)
-            if not self._filter_widget:
-                # Search filter widget got destroyed. No point checking for filter text anymore.
-                return
-            filter_text = bui.textwidget(parent=self._root_widget, query=self._filter_widget)
-            if self.selected_category is None:
-                continue
-            try:
-                await self.draw_plugin_names(
-                    self.selected_category, search_term=filter_text.lower(), order=self.selected_alphabet_order)
-            except CategoryDoesNotExist:
-                pass
+        """
+        Redraw the plugin list once the filter text has stopped changing for
+        a moment, cancelling a redraw that's still in progress for an older
+        search term. Text widgets don't notify about edits, so the text is
+        still checked periodically, but less and less often while nothing is
+        being typed.
+        """
+        debounce_delay = 0.15
+        # Capped low enough that the first keystroke after a pause still shows
+        # up about as quickly as when the text was checked at a fixed rate.
+        min_check_interval, max_check_interval = 0.1, 0.3
+        check_interval = min_check_interval
+        filter_text = ""
+        filter_text_changed_at = None
+        redraw_task = None
+        try:
+            while True:
+                await asyncio.sleep(check_interval)
+                if not self._filter_widget.exists():
+                    # Search filter widget got destroyed. No point checking for filter text anymore.
+                    return
+                new_filter_text = bui.textwidget(
+                    parent=self._root_widget, query=self._filter_widget).lower()
+                if new_filter_text != filter_text:
+                    filter_text = new_filter_text
+                    filter_text_changed_at = time.monotonic()
+                    check_interval = min_check_interval
+                    continue
+                if filter_text_changed_at is None:
+                    check_interval = min(check_interval * 2, max_check_interval)
+                    continue
+                if self.selected_category is None:
+                    continue
+                if time.monotonic() - filter_text_changed_at < debounce_delay:
+                    continue
+                filter_text_changed_at = None
+                if redraw_task is not None:
+                    redraw_task.cancel()
+                redraw_task = loop.create_task(self.draw_plugin_names_for_search_term(filter_text))
+        finally:
+            if redraw_task is not None:
+                redraw_task.cancel()
+
+    async def draw_plugin_names_for_search_term(self, search_term):
+        try:
+            await self.draw_plugin_names(
+                self.selected_category, search_term=search_term, order=self.selected_alphabet_order)
+        except CategoryDoesNotExist:
+            pass
 
     def draw_settings_icon(self):
         settings_pos_x = (610 if _uiscale() is babase.UIScale.SMALL else
@@ -2217,23 +3971,17 @@ class PluginManagerWindow(bui.MainWindow):
             draw_controller=controller_button
         )
 
-    def search_term_filterer(self, plugin, search_term):
-        # This helps resolve "plugin name" to "plugin_name".
-        if search_term in plugin.info["description"].lower():
-            return True
-        search_term = search_term.replace(" ", "_")
-        if search_term in plugin.name:
-            return True
-        for author in plugin.info["authors"]:
-            if search_term in author["name"].lower():
-                return True
-        return False
-
     # XXX: Not sure if this is the best way to handle search filters.
     async def draw_plugin_names(self, category, search_term="", refresh=False, order='a_z'):
-        # Re-draw plugin list UI if either search term or category was switched.
-        to_draw_plugin_names = (search_term, category) != (self._last_filter_text,
-                                                           self.selected_category)
+        # Any draw still in progress is superseded by this one.
+        self._draw_generation += 1
+        generation = self._draw_generation
+        # Re-draw plugin list UI if either search term or category was switched,
+        # or if the last draw was left halfway.
+        to_draw_plugin_names = (
+            (search_term, category) != (self._last_filter_text, self.selected_category) or
+            self._last_filter_plugins is None
+        )
         if not (to_draw_plugin_names or refresh):
             return
 
@@ -2252,25 +4000,29 @@ class PluginManagerWindow(bui.MainWindow):
             else:
                 return
 
+        def return_name(val):
+            return val.name
+
         if search_term:
-            plugins = list(filter(
-                lambda plugin: self.search_term_filterer(plugin, search_term),
-                category_plugins,
-            ))
+            search_index = await self.plugin_manager.categories[
+                category if category != 'Installed' else 'All'].get_search_index()
+            matches = search_index.search(search_term)
+            matches.sort(key=lambda match: return_name(match[1]),
+                         reverse=(True if order == 'z_a' else False))
+            # Better matches go first, keeping the chosen order among equally good ones.
+            matches.sort(key=lambda match: match[0])
+            plugins = [plugin for rank, plugin in matches]
         else:
             plugins = category_plugins
+            plugins.sort(key=return_name, reverse=(True if order == 'z_a' else False))
 
-        def return_name(val):
-            return val.name
-        plugins.sort(key=return_name, reverse=(True if order == 'z_a' else False))
+        if generation != self._draw_generation:
+            return
 
         if plugins == self._last_filter_plugins and not refresh:
             # Plugins names to draw on UI are already drawn.
             return
 
-        self._last_filter_text = search_term
-        self._last_filter_plugins = plugins
-
         if not self._columnwidget.exists():
             return
 
@@ -2281,30 +4033,76 @@ class PluginManagerWindow(bui.MainWindow):
         else:
             plugin_names_to_draw = plugins
 
-        [plugin.delete() for plugin in self._columnwidget.get_children()]
+        plugin_names_ready_to_draw = self.plugin_manager.compatibility_index.filter(
+            plugin_names_to_draw)
+
         text_widget = bui.textwidget(parent=self._columnwidget)
         text_widget.delete()
-        # await asyncio.gather(*plugin_names_to_draw)
-
-        plugin_names_ready_to_draw = []
-        for plugin in plugin_names_to_draw:
-            try:
-                lcv = plugin.latest_compatible_version
-            except NoCompatibleVersion:
-                continue
-            plugin_names_ready_to_draw += [plugin]
 
-        for i, plugin in enumerate(plugin_names_ready_to_draw):
-            await self.draw_plugin_name(plugin, plugin_names_ready_to_draw)
+        # The list is only known to show these plugins once all the rows are drawn.
+        self._last_filter_plugins = None
+        if await self.draw_plugin_name_rows(plugin_names_ready_to_draw, generation):
+            self._last_filter_text = search_term
+            self._last_filter_plugins = plugins
 
-    async def draw_plugin_name(self, plugin, plugins_list):
+    async def draw_plugin_name_rows(self, plugins, generation):
+        """
+        Bind `plugins` to the rows of the plugin list, top to bottom. Rows that
+        are already drawn get edited in place instead of being deleted and
+        created again, and only the rows past the end of `plugins` are removed.
+        The first screenful of rows is drawn right away and the rest follow in
+        batches, yielding to the event loop in between so the game keeps
+        rendering frames. Stops as soon as a newer draw than `generation` has
+        started. Returns whether all the rows got drawn.
+        """
+        rows = self._plugin_name_rows
+        if not all(row.exists() for row in rows):
+            for row in rows:
+                if row.exists():
+                    row.delete()
+            rows.clear()
+        for row in rows[len(plugins):]:
+            row.delete()
+        del rows[len(plugins):]
+        self.plugins_in_current_view.clear()
 
+        batch_start = 0
+        batch_size = self.VISIBLE_PLUGIN_NAME_ROWS
+        while batch_start < len(plugins):
+            batch = plugins[batch_start:batch_start + batch_size]
+            # Local states of a whole batch are looked up together rather than
+            # one row at a time.
+            colors = await asyncio.gather(
+                *(self.get_plugin_name_color(plugin) for plugin in batch)
+            )
+            if generation != self._draw_generation or not self._columnwidget.exists():
+                return False
+            for row_index, (plugin, color) in enumerate(zip(batch, colors), start=batch_start):
+                if row_index < len(rows):
+                    bui.textwidget(
+                        edit=rows[row_index],
+                        color=color,
+                        text=plugin.name.replace('_', ' ').title(),
+                        on_activate_call=babase.Call(self.show_plugin_window, plugin, plugins),
+                    )
+                else:
+                    rows.append(self.create_plugin_name_row(plugin, plugins, color))
+                self.plugins_in_current_view[plugin.name] = rows[row_index]
+            batch_start += batch_size
+            batch_size = self.PLUGIN_NAME_ROWS_PER_BATCH
+            await asyncio.sleep(0)
+            if generation != self._draw_generation:
+                return False
+        return True
+
+    async def get_plugin_name_color(self, plugin):
         if plugin.is_installed:
             local_plugin = plugin.get_local()
             if await local_plugin.is_enabled():
                 if not local_plugin.is_installed_via_plugin_manager:
                     color = (0.8, 0.2, 0.2)
-                elif local_plugin.version == plugin.latest_compatible_version.number:
+                elif (local_plugin.version ==
+                      self.plugin_manager.compatibility_index.get_version_number(plugin)):
                     color = (0, 0.95, 0.2)
                 else:
                     color = (1, 0.6, 0)
@@ -2312,30 +4110,32 @@ class PluginManagerWindow(bui.MainWindow):
                 color = (1, 1, 1)
         else:
             color = (0.5, 0.5, 0.5)
+        return color
+
+    def create_plugin_name_row(self, plugin, plugins_list, color):
+        return bui.textwidget(
+            parent=self._columnwidget,
+            size=(410, 30),
+            selectable=True,
+            always_highlight=True,
+            color=color,
+            text=plugin.name.replace('_', ' ').title(),
+            click_activate=True,
+            on_activate_call=babase.Call(self.show_plugin_window, plugin, plugins_list),
+            h_align='left',
+            v_align='center',
+            maxwidth=420
+        )
 
+    async def draw_plugin_name(self, plugin, plugins_list):
+        color = await self.get_plugin_name_color(plugin)
         plugin_name_widget_to_update = self.plugins_in_current_view.get(plugin.name)
-        if plugin_name_widget_to_update:
+        if plugin_name_widget_to_update and plugin_name_widget_to_update.exists():
             bui.textwidget(
                 edit=plugin_name_widget_to_update,
-                color=color
-            )
-        else:
-            text_widget = bui.textwidget(
-                parent=self._columnwidget,
-                size=(410, 30),
-                selectable=True,
-                always_highlight=True,
                 color=color,
-                text=plugin.name.replace('_', ' ').title(),
-                click_activate=True,
                 on_activate_call=lambda: self.show_plugin_window(plugin, plugins_list),
-                h_align='left',
-                v_align='center',
-                maxwidth=420
             )
-            self.plugins_in_current_view[plugin.name] = text_widget
-            # XXX: This seems nicer. Might wanna use this in future.
-            # text_widget.add_delete_callback(lambda: self.plugins_in_current_view.pop(plugin.name))
 
     def show_plugin_window(self, plugin, plugins_list):
         PluginWindow(
@@ -2354,10 +4154,10 @@ class PluginManagerWindow(bui.MainWindow):
         )
 
     async def select_category(self, category):
-        self.plugins_in_current_view.clear()
         self.draw_category_selection_button(post_label=category)
         await self.draw_plugin_names(
-            category, search_term=self._last_filter_text, refresh=True, order=self.selected_alphabet_order)
+            category, search_term=self.get_filter_text(), refresh=True,
+            order=self.selected_alphabet_order)
         self.selected_category = category
 
     def cleanup(self):
@@ -2365,6 +4165,7 @@ class PluginManagerWindow(bui.MainWindow):
         for plugin in self._columnwidget.get_children():
             plugin.delete()
         self.plugins_in_current_view.clear()
+        self._plugin_name_rows.clear()
         self._last_filter_text = ""
         self._last_filter_plugins = []
 
@@ -2403,8 +4204,11 @@ class PluginManagerSettingsWindow(popup.PopupWindow):
     async def draw_ui(self):
         b_text_color = (0.8, 0.8, 0.85)
         s = 1.25 if _uiscale() is babase.UIScale.SMALL else 1.27 if _uiscale() is babase.UIScale.MEDIUM else 1.3
+        text_scale = 0.7 * s
+        # The layout below was made for 4 settings, any more need a row each.
+        settings_height = 34 * text_scale * max(0, len(self.settings) - 4)
         width = 380 * s
-        height = 150 + 150 * s
+        height = 150 + 150 * s + settings_height
         color = (0.9, 0.9, 0.9)
 
         # Subtracting the default bluish-purple color from the texture, so it's as close
@@ -2412,7 +4216,6 @@ class PluginManagerSettingsWindow(popup.PopupWindow):
         discord_fg_color = (10 - 0.32, 10 - 0.39, 10 - 0.96)
         discord_bg_color = (0.525, 0.595, 1.458)
         github_bg_color = (0.23, 0.23, 0.23)
-        text_scale = 0.7 * s
         self._transition_out = 'out_scale'
         transition = 'in_scale'
         button_size = (32 * s, 32 * s)
@@ -2461,6 +4264,27 @@ class PluginManagerSettingsWindow(popup.PopupWindow):
             color=b_text_color,
             draw_controller=self._changelog_button,
         )
+        if _TRACER.enabled:
+            self._timings_button = t = bui.buttonwidget(
+                parent=self._root_widget,
+                position=((width * 0.5) - button_size[0] / 2 - 5, pos),
+                size=(80, 30),
+                textcolor=b_text_color,
+                button_type='square',
+                label=''
+            )
+            bui.buttonwidget(t, on_activate_call=lambda: TimingsWindow(t))
+            bui.textwidget(
+                parent=self._root_widget,
+                position=((width * 0.5) - button_size[0] / 2, pos),
+                size=(70, 30),
+                scale=0.6,
+                h_align='center',
+                v_align='center',
+                text='Timings',
+                color=b_text_color,
+                draw_controller=self._timings_button,
+            )
         self._save_button = bui.buttonwidget(
             parent=self._root_widget,
             position=((width * 0.82) - button_size[0] / 2, pos),
@@ -2489,7 +4313,7 @@ class PluginManagerSettingsWindow(popup.PopupWindow):
             )
             pos -= 34 * text_scale
 
-        pos = height - 200
+        pos = height - 200 - settings_height
         bui.textwidget(
             parent=self._root_widget,
             position=(width * 0.49, pos-5),
@@ -2624,7 +4448,8 @@ class PluginManagerSettingsWindow(popup.PopupWindow):
 
     def save_settings_button(self):
         babase.app.config["Community Plugin Manager"]["Settings"] = self.settings.copy()
-        babase.app.config.commit()
+        _TRACER.enabled = self.settings["Record Timings"]
+        commit_config()
         self._ok()
         bui.getsound('gunCocking').play()
 
@@ -2920,6 +4745,235 @@ class EntryPoint(babase.Plugin):
         allsettings.AllSettingsWindow = NewAllSettingsWindow
         DNSBlockWorkaround.apply()
         asyncio.set_event_loop(babase._asyncio._asyncio_event_loop)
+        loop.create_task(DNSBlockWorkaround.prewarm())
         startup_tasks = StartupTasks()
 
         loop.create_task(startup_tasks.execute())
+
+
+class HeadlessPluginManager:
+    """
+    Runs plugin manager's commands against a plugin directory without the
+    game, e.g. to provision the plugins of dedicated servers before launching
+    them.
+    """
+
+    def __init__(self, max_parallel=MAX_PARALLEL_UPDATES):
+        self.plugin_manager = PluginManager()
+        self.max_parallel = max_parallel
+
+    @property
+    def compatibility_index(self):
+        return self.plugin_manager.compatibility_index
+
+    async def get_plugins(self):
+        await self.plugin_manager.setup_index()
+        plugins = await self.plugin_manager.categories["All"].get_plugins()
+        return {plugin.name: plugin for plugin in plugins}
+
+    async def install_or_update(self, plugins, action):
+        """
+        Install the latest compatible versions of `plugins`, reporting each one
+        as "<action>ed". Returns the exit code for the command.
+        """
+        if not plugins:
+            print("Nothing to do.")
+            return 0
+        updater = PluginUpdater(max_parallel=self.max_parallel)
+        updated, failed = await updater.update(plugins)
+        past_tense = action if action.endswith("e") else f"{action}e"
+        for plugin in updated:
+            print(f"{past_tense.title()}d {plugin.name} {plugin.latest_compatible_version.number}")
+        for plugin in failed:
+            print(f"Failed to {action} {plugin.name}", file=sys.stderr)
+        return 1 if failed else 0
+
+    async def list(self, installed_only=False):
+        plugins = await self.get_plugins()
+        for name, plugin in sorted(plugins.items()):
+            if installed_only and not plugin.is_installed:
+                continue
+            latest_version = self.compatibility_index.get_version_number(plugin) or "-"
+            installed_version = plugin.get_local().version if plugin.is_installed else None
+            status = ""
+            if plugin.is_installed:
+                status = f"installed {installed_version or '(unknown version)'}"
+                if self.compatibility_index.has_update(plugin):
+                    status += ", update available"
+            print(f"{name:<32} {latest_version:<10} {status}".rstrip())
+        return 0
+
+    async def install(self, names):
+        plugins = await self.get_plugins()
+        unknown_names = [name for name in names if name not in plugins]
+        for name in unknown_names:
+            print(f"No plugin named {name}", file=sys.stderr)
+        to_install = []
+        for name in names:
+            plugin = plugins.get(name)
+            if plugin is None:
+                continue
+            if plugin not in self.compatibility_index:
+                print(f"{name} has no version compatible with API "
+                      f"{self.compatibility_index.api_version}", file=sys.stderr)
+                unknown_names.append(name)
+                continue
+            if plugin.is_installed and not self.compatibility_index.has_update(plugin):
+                print(f"{name} is already up to date")
+                continue
+            to_install.append(plugin)
+        exit_code = await self.install_or_update(to_install, "install")
+        return 1 if unknown_names else exit_code
+
+    async def update(self, names=()):
+        plugins = await self.get_plugins()
+        if names:
+            plugins = {name: plugin for name, plugin in plugins.items() if name in names}
+        to_update = [
+            plugin for plugin in self.compatibility_index.filter(plugins.values())
+            if plugin.is_installed and self.compatibility_index.has_update(plugin)
+        ]
+        return await self.install_or_update(to_update, "update")
+
+    async def rollback(self, names):
+        plugins = await self.get_plugins()
+        exit_code = 0
+        for name in names:
+            plugin = plugins.get(name)
+            if plugin is None or not plugin.is_installed:
+                print(f"{name} isn't installed", file=sys.stderr)
+                exit_code = 1
+            elif plugin.get_previous_version() is None:
+                print(f"{name} has no previous version to roll back to", file=sys.stderr)
+                exit_code = 1
+            elif not await plugin.rollback():
+                exit_code = 1
+        return exit_code
+
+    async def sync(self, recorded_names):
+        """
+        Install the plugins recorded in the config that are missing from the
+        plugin directory, and update the installed ones that are outdated.
+        """
+        plugins = await self.get_plugins()
+        to_sync = []
+        for name in recorded_names:
+            plugin = plugins.get(name)
+            if plugin is None:
+                print(f"{name} isn't available in any plugin source, skipping", file=sys.stderr)
+                continue
+            if plugin not in self.compatibility_index:
+                print(f"{name} has no version compatible with API "
+                      f"{self.compatibility_index.api_version}, skipping", file=sys.stderr)
+                continue
+            if not plugin.is_installed or self.compatibility_index.has_update(plugin):
+                to_sync.append(plugin)
+        to_sync.extend(
+            plugin for plugin in self.compatibility_index.filter(plugins.values())
+            if plugin.name not in recorded_names and plugin.is_installed and
+            self.compatibility_index.has_update(plugin)
+        )
+        return await self.install_or_update(to_sync, "sync")
+
+
+def headless_main(argv=None):
+    """
+    Command line entry point, run as `python plugin_manager.py <command>`.
+    Each invocation manages a single plugin directory, so several servers can
+    be provisioned in parallel by running one process per server.
+    """
+    global PLUGIN_DIRECTORY, _app_api_version, _NETWORK_CACHE, _LOCAL_PLUGIN_INDEX, _PLUGIN_STORE
+
+    parser = argparse.ArgumentParser(
+        prog="plugin_manager.py",
+        description="Manage BombSquad plugins without launching the game.",
+    )
+    parser.add_argument(
+        "--directory", required=True,
+        help="plugin directory to manage, usually ba_root/mods")
+    parser.add_argument(
+        "--config",
+        help="game's config.json to keep plugin manager's state in "
+             "(default: config.json in the parent of the plugin directory)")
+    parser.add_argument(
+        "--cache-directory", default=babase.app.env.cache_directory,
+        help="directory to cache downloaded metadata and plugins in (default: %(default)s)")
+    parser.add_argument(
+        "--api-version", type=int, default=_app_api_version,
+        help="game API version to pick plugin versions for (default: %(default)s)")
+    parser.add_argument(
+        "--max-parallel", type=int, default=MAX_PARALLEL_UPDATES,
+        help="number of plugins to download at once (default: %(default)s)")
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="save timings of DNS lookups, downloads, installs etc. to FILE as JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="list available plugins")
+    list_parser.add_argument("--installed", action="store_true",
+                             help="only list installed plugins")
+    install_parser = subparsers.add_parser("install", help="install plugins")
+    install_parser.add_argument("plugins", nargs="+")
+    update_parser = subparsers.add_parser(
+        "update", help="update installed plugins (all of them if none are given)")
+    update_parser.add_argument("plugins", nargs="*")
+    rollback_parser = subparsers.add_parser(
+        "rollback", help="reinstall the previously installed versions of plugins")
+    rollback_parser.add_argument("plugins", nargs="+")
+    subparsers.add_parser(
+        "sync",
+        help="install plugins recorded in the config that are missing and update outdated ones")
+    args = parser.parse_args(argv)
+
+    PLUGIN_DIRECTORY = os.path.abspath(args.directory)
+    _app_api_version = args.api_version
+    cache_directory = os.path.join(os.path.abspath(args.cache_directory), "plugin_manager")
+    _NETWORK_CACHE = NetworkCache(os.path.join(cache_directory, "network"))
+    # Shared by all plugin directories, so each plugin version gets downloaded
+    # only once no matter how many servers use it.
+    _PLUGIN_STORE = PluginStore(os.path.join(cache_directory, "store"))
+    # Each plugin directory gets its own index, so that processes managing
+    # different directories don't overwrite each other's.
+    _LOCAL_PLUGIN_INDEX = LocalPluginIndex(os.path.join(
+        cache_directory,
+        "local_plugins",
+        f"{hashlib.md5(PLUGIN_DIRECTORY.encode('utf-8')).hexdigest()}.json",
+    ))
+    config_path = args.config or os.path.join(os.path.dirname(PLUGIN_DIRECTORY), "config.json")
+    # Listing plugins mustn't leave the game's config changed behind it.
+    babase.app.config = HeadlessConfig(config_path, read_only=args.command == "list")
+    babase.app.config.setdefault("Plugins", {})
+    os.makedirs(PLUGIN_DIRECTORY, exist_ok=True)
+
+    recorded_names = tuple(
+        babase.app.config.get("Community Plugin Manager", {}).get("Installed Plugins", {})
+    )
+    StartupTasks().setup_config()
+    if args.trace:
+        _TRACER.enabled = True
+    DNSBlockWorkaround.apply()
+    headless_plugin_manager = HeadlessPluginManager(max_parallel=args.max_parallel)
+    if args.command == "list":
+        command = headless_plugin_manager.list(installed_only=args.installed)
+    elif args.command == "install":
+        command = headless_plugin_manager.install(args.plugins)
+    elif args.command == "update":
+        command = headless_plugin_manager.update(args.plugins)
+    elif args.command == "rollback":
+        command = headless_plugin_manager.rollback(args.plugins)
+    else:
+        command = headless_plugin_manager.sync(recorded_names)
+    try:
+        exit_code = loop.run_until_complete(command)
+    except urllib.error.URLError as e:
+        print(f"Couldn't reach plugin sources: {e.reason}", file=sys.stderr)
+        exit_code = 1
+    finally:
+        _LOCAL_PLUGIN_INDEX.save()
+        _CONNECTION_POOL.close()
+        if args.trace:
+            _TRACER.dump(args.trace)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(headless_main())
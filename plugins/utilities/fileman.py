@@ -3,7 +3,7 @@
 # Bug? Feedback? Telegram >> @BroBordd
 
 """
-FileMan v1.0 - Advanced file manager
+FileMan v1.1 - Advanced file manager
 
 Adds a button to settings menu.
 Experimental. Read code to know more.
@@ -74,10 +74,15 @@ from mimetypes import guess_type
 from random import uniform as UF
 from threading import Thread
 from pathlib import Path
+try:
+    # replay plugin, reads and caches replay durations
+    from replay import BRM
+except ImportError:
+    BRM = None
 
 
 class FileMan(MainWindow):
-    VER = '1.0'
+    VER = '1.1'
     INS = []
 
     @classmethod
@@ -700,6 +705,18 @@ class FileMan(MainWindow):
                                     position=(xs/2-75, ys/2-135),
                                     size=(150, 40)
                                 )
+                                if BRM:
+                                    s.reptw = tw(
+                                        parent=p,
+                                        position=(xs/2-20, ys-220),
+                                        text='Reading duration...',
+                                        h_align='center',
+                                        color=s.COL4,
+                                        maxwidth=xs-60
+                                    )
+                                    s.repbuf = None
+                                    Thread(target=Call(s._replen, h)).start()
+                                    s.rept = tuck(0.2, s.replen, repeat=True)
                             elif ty == 'Texture' and bn in TEX():
                                 wd = min(xs-80, ys-150)
                                 tex = gt(splitext(bn)[0])
@@ -1257,6 +1274,29 @@ class FileMan(MainWindow):
         s.snd(f'raceBeep{str(i+1)}')
         teck(0.1, gs(f'raceBeep{str(j+1)}').play)
 
+    def _replen(s, h):
+        try:
+            s.repbuf = BRM.read(h)['duration']
+        except Exception:
+            s.repbuf = -1
+            return
+        try:
+            BRM.save()
+        except OSError:
+            # the length is known, it just won't be cached next time
+            pass
+
+    def replen(s):
+        t = s.repbuf
+        if t is None:
+            return
+        s.repbuf = s.rept = None
+        try:
+            tw(s.reptw, text=f"Duration: {t//3600000}:{t//60000 % 60:02}:{t//1000 % 60:02}"
+               if t >= 0 else "Couldn't read replay")
+        except Exception:
+            pass
+
     def spy(s, f):
         if s.buf is None:
             return
@@ -3,7 +3,7 @@
 # Bug? Feedback? Telegram >> @BroBordd
 
 """
-Replay v2.5 - Simple replay player
+Replay v2.6 - Simple replay player
 
 Experimental. Feedback is appreciated.
 Adds a button to pause menu and watch menu.
@@ -14,6 +14,9 @@ Features:
 - Advanced free camera target control
 - Ability to zoom in/out to target
 - Uses pybrp to display how long a replay is
+- Caches replay durations, lists can sort by length
+- Scans replay folders on worker threads
+- Clip button exports part of a replay as a new one
 - Good UI with detailed toast pop ups
 - Ability to show/hide UI
 - Uses threading everywhere
@@ -57,18 +60,22 @@ from _babase import (
     get_camera_position as GCP,
     set_camera_manual as SCM,
     set_camera_target as SCT,
-    get_camera_target as GCT
+    get_camera_target as GCT,
+    env
 )
-from os.path import join, dirname, getsize, basename
+from os.path import join, dirname, getsize, basename, abspath, exists, splitext
+from concurrent.futures import ThreadPoolExecutor
+from json import load as jl, dump as jd
 from time import time, strftime, gmtime
+from os import listdir as ls, stat, replace, remove, cpu_count
 from random import uniform as uf
-from threading import Thread
-from os import listdir as ls
+from threading import Thread, Lock
 from struct import unpack
+from mmap import mmap, ACCESS_READ
 
 
 class Replay:
-    VER = '2.5'
+    VER = '2.6'
     COL1 = (0.18, 0.18, 0.18)
     COL2 = (1, 1, 1)
     COL3 = (0, 1, 0)
@@ -84,7 +91,6 @@ class Replay:
     def __init__(s, source=None):
         s.sl = s.rn = s.buf = None
         s.ohno = False
-        s._h = _H()
         s.p = s.cw(
             src=source.get_screen_space_center(),
             p=GOS(),
@@ -100,46 +106,110 @@ class Replay:
             pos=(175, 460),
             scale=2
         )
-        sy = 360
-        p1 = sw(
+        s.p1 = sw(
             parent=s.p,
-            size=(sy, sy),
+            size=(360, 360),
             position=(25, 80)
         )
         s.rd = rdir()
-        a = [_ for _ in ls(s.rd) if _.endswith('.brp')]
+        s.names = [_ for _ in ls(s.rd) if _.endswith('.brp')]
+        s.p2 = None
+        s.srt = False
+        s.sb = s.bw(
+            p=s.p,
+            pos=(305, 455),
+            size=(70, 30),
+            label='Name',
+            oac=s.sort
+        )
+        s.fill()
+        s.stw = s.tw(
+            p=s.p,
+            pos=(25, 452),
+            scale=0.6,
+            color=s.COL4
+        )
+        s.scan = BRM.scan([join(s.rd, _) for _ in s.names], s.scanp, s.scand)
+        teck(0.5, s.meta)
+        s.psrc = None
+        for _ in range(3):
+            b = s.bw(
+                p=s.p,
+                pos=(25+120*_, 30),
+                size=(120, 40),
+                label=['Show', 'Copy', 'Run'][_],
+                oac=Call(s.con, [s.show, s.copy, s.play][_]),
+                icon=gt(['folder', 'file', 'nextLevelIcon'][_])
+            )
+            if _ == 2:
+                s.psrc = b
+
+    def fill(s):
+        sy = 360
+        s.p2 and s.p2.delete()
+        a = s.names
+        if s.srt:
+            # longest first, not scanned yet last
+            a = sorted(a, key=lambda _: -(
+                BRM.get(join(s.rd, _)) or {'duration': -1})['duration'])
         v = 30*len(a)
-        p2 = ocw(
-            parent=p1,
+        s.p2 = ocw(
+            parent=s.p1,
             background=False,
             size=(sy, v)
         )
         s.kids = []
+        s.durs = {}
+        s.sl = None
         for i, _ in enumerate(a):
             t = s.tw(
-                p=p2,
+                p=s.p2,
                 click_activate=True,
                 selectable=True,
                 pos=(0, v-30*i-30),
                 text=_,
-                maxwidth=sy,
-                size=(sy, 30),
-                color=s.COL2,
+                maxwidth=sy-80,
+                size=(sy-80, 30),
+                color=s.COL3 if _ == s.rn else s.COL2,
                 oac=Call(s.hl, i, _)
             )
             s.kids.append(t)
-        s.psrc = None
-        for _ in range(3):
-            b = s.bw(
-                p=s.p,
-                pos=(25+120*_, 30),
-                size=(120, 40),
-                label=['Show', 'Copy', 'Run'][_],
-                oac=Call(s.con, [s.show, s.copy, s.play][_]),
-                icon=gt(['folder', 'file', 'nextLevelIcon'][_])
+            if _ == s.rn:
+                s.sl = i
+            m = BRM.get(join(s.rd, _))
+            d = s.tw(
+                p=s.p2,
+                pos=(sy-75, v-30*i-30),
+                text=FOR(m['duration']/1000) if m else '...',
+                size=(70, 30),
+                h_align='right',
+                color=s.COL4
             )
-            if _ == 2:
-                s.psrc = b
+            if not m:
+                s.durs[_] = d
+
+    def scanp(s, a, b):
+        s.stw.exists() and otw(s.stw, text=f'Scanning {a*100//b}%' if b else '')
+
+    def scand(s):
+        s.stw.exists() and otw(s.stw, text='')
+
+    def meta(s):
+        if not s.p.exists():
+            s.scan.cancel()
+            return
+        for n, d in list(s.durs.items()):
+            m = BRM.get(join(s.rd, n))
+            if m:
+                otw(d, text=FOR(m['duration']/1000))
+                del s.durs[n]
+        teck(0.5, s.meta)
+
+    def sort(s):
+        s.snd('dingSmall')
+        s.srt = not s.srt
+        obw(s.sb, label=['Name', 'Length'][s.srt])
+        s.fill()
 
     def snd(s, t):
         h = gs(t)
@@ -245,9 +315,15 @@ class Replay:
 
     def calc(s):
         try:
-            s.buf = GMS(s._h, s.get(), s.par)
+            s.buf = BRM.read(s.get(), s.par)['duration']
         except:
             s.buf = 0
+            return
+        try:
+            BRM.save()
+        except OSError:
+            # the length is known, it just won't be cached next time
+            pass
 
     def calc2(s, t):
         otw(s.st, text='Starting...' if t else 'Wait what?')
@@ -328,13 +404,15 @@ class Player:
     COL15 = (1, 1, 1)
     COL16 = (0.1, 0.2, 0.4)
     COL17 = (1, 1.7, 2)
+    COL18 = (0.5, 0, 0.25)
+    COL19 = (1, 0, 0.5)
 
     def __init__(s, path, duration):
         s.path = path
         s.du = duration
         s.ds = s.du / 1000
         s.ps = s.nah = s.camon = s.snma = s.gay = False
-        s.caml = None
+        s.caml = s.cpa = s.cpw = None
         s.rn = s.st = s.pr = 0
         s.camz = 1
         [setattr(s, _, []) for _ in ['kids', 'camkids', 'hdkids', 'snkids', 'snuikids']]
@@ -501,9 +579,29 @@ class Player:
             position=(pos[0]+2, pos[1]+1),
             size=(47, 47),
         ))
+        # clip
+        pos = (x-520, 15)
+        f(s.bw(
+            p=p,
+            pos=pos,
+            size=(50, 50),
+            color=s.COL18,
+            oac=s.clip
+        ))
+        s.cpt = otw(
+            parent=p,
+            text=['CLIP', 'END'][s.cpa is not None],
+            color=s.COL19,
+            position=(pos[0]+25, pos[1]+25),
+            h_align='center',
+            v_align='center',
+            scale=0.7,
+            shadow=0.3
+        )
+        f(s.cpt)
         # progress
         pos = (285, sy/2-2)
-        s.px = x-790
+        s.px = x-855
         f(iw(
             parent=p,
             texture=gt('white'),
@@ -1205,6 +1303,51 @@ class Player:
         except ReferenceError:
             pass
 
+    def clip(s):
+        if s.cpw:
+            # one at a time, they'd pick the same free name
+            s.hm('Clip', 'Still exporting the last clip', s.COL0, s.COL1)
+            return
+        t = s.rn-s.st
+        if s.cpa is None:
+            s.cpa = t
+            otw(s.cpt, text='END')
+            s.hm('Clip', f'Starts at {FOR(t)}, press again where it ends', s.COL18, s.COL19)
+            return
+        a, b = sorted((s.cpa, t))
+        s.cpa = None
+        otw(s.cpt, text='CLIP')
+        if b-a < 1:
+            s.hm('Clip', 'Too short, cancelled', s.COL0, s.COL1)
+            return
+        n = join(dirname(s.path), f'{splitext(basename(s.path))[0]}_{int(a)}-{int(b)}')
+        o, i = n+'.brp', 1
+        while exists(o):
+            # never overwrite an earlier clip (or anything else)
+            i += 1
+            o = f'{n}_{i}.brp'
+        s.cpb = None
+        Thread(target=Call(s._clip, o, a, b)).start()
+        s.cpw = tock(0.2, s.clipd, repeat=True)
+        s.hm('Clip', f'Exporting {FOR(a)} to {FOR(b)}...', s.COL18, s.COL19)
+
+    def _clip(s, o, a, b):
+        try:
+            BRP.clip(s.path, o, a*1000, b*1000)
+            s.cpb = basename(o)
+        except Exception:
+            s.cpb = ''
+
+    def clipd(s):
+        if s.cpb is None:
+            return
+        s.cpw = None
+        t = [f'Saved as {s.cpb}', "Couldn't export clip"][not s.cpb]
+        if s.ok.exists():
+            s.hm('Clip', t, *[(s.COL18, s.COL19), (s.COL0, s.COL1)][not s.cpb])
+        else:
+            push(t, color=[s.COL19, s.COL1][not s.cpb])
+
     def replay(s):
         SEEK(-10**10)
 
@@ -1254,110 +1397,556 @@ def CMD_NAMES(): return {0: 'BaseTimeStep', 1: 'StepSceneGraph', 2: 'AddSceneGra
                          29: 'SetNodeAttrNodes', 30: 'SetNodeAttrPlayer', 31: 'SetNodeAttrPlayerNull', 32: 'SetNodeAttrMaterials', 33: 'SetNodeAttrTexture', 34: 'SetNodeAttrTextureNull', 35: 'SetNodeAttrTextures', 36: 'SetNodeAttrSound', 37: 'SetNodeAttrSoundNull', 38: 'SetNodeAttrSounds', 39: 'SetNodeAttrMesh', 40: 'SetNodeAttrMeshNull', 41: 'SetNodeAttrMeshes', 42: 'SetNodeAttrCollisionMesh', 43: 'SetNodeAttrCollisionMeshNull', 44: 'SetNodeAttrCollisionMeshes', 45: 'PlaySoundAtPosition', 46: 'PlaySound', 47: 'EmitBGDynamics', 48: 'EndOfFile', 49: 'DynamicsCorrection', 50: 'ScreenMessageBottom', 51: 'ScreenMessageTop', 52: 'AddData', 53: 'RemoveData', 54: 'CameraShake'}
 
 
-class _H:
-    class _N:
-        def __init__(self):
-            self.l, self.r, self.p, self.f = -1, -1, 0, 0
+class BRP:
+    """
+    Huffman codec of BRP (replay) messages, usable on its own:
+    >>> from replay import BRP
+    >>> raw = BRP.decompress(msg)
+    >>> for offset, cmd, payload in BRP.commands(path):
+    ...     print(offset, CMD_NAMES()[cmd], bytes(payload))
+    >>> BRP.clip(path, out, 60000, 75000)
+
+    The tree and the 12 bit lookup table are built once and shared.
+    A table entry holds every literal or Huffman code that fits in
+    its 12 bits (about 3 bytes of output), the rare longer codes
+    fall back to walking the tree.
+    """
+    B = 12
+    # StepSceneGraph, sounds, BG dynamics, screen messages, camera shake
+    FX = {1, 45, 46, 47, 50, 51, 54}
+    nodes = sym = ln = cds = None
 
-    def __init__(self):
-        gf, self.nodes = G_FREQS(), [self._N()for _ in range(511)]
-        for i in range(256):
-            self.nodes[i].f = gf[i]
+    @classmethod
+    def tree(c):
+        if c.nodes is not None:
+            return c.nodes
+        gf = G_FREQS()
+        # [left, right, parent, frequency]
+        n = [[-1, -1, 0, gf[i] if i < 256 else 0] for i in range(511)]
         nc = 256
         while nc < 511:
-            s1, s2 = -1, -1
             i = 0
-            while self.nodes[i].p != 0:
+            while n[i][2] != 0:
                 i += 1
             s1 = i
             i += 1
-            while self.nodes[i].p != 0:
+            while n[i][2] != 0:
                 i += 1
             s2 = i
             i += 1
             while i < nc:
-                if self.nodes[i].p == 0:
-                    if self.nodes[s1].f > self.nodes[s2].f:
-                        if self.nodes[i].f < self.nodes[s1].f:
+                if n[i][2] == 0:
+                    if n[s1][3] > n[s2][3]:
+                        if n[i][3] < n[s1][3]:
                             s1 = i
-                    elif self.nodes[i].f < self.nodes[s2].f:
+                    elif n[i][3] < n[s2][3]:
                         s2 = i
                 i += 1
-            self.nodes[nc].f = self.nodes[s1].f+self.nodes[s2].f
-            self.nodes[s1].p = self.nodes[s2].p = nc-255
-            self.nodes[nc].r, self.nodes[nc].l = s1, s2
+            n[nc][3] = n[s1][3]+n[s2][3]
+            n[s1][2] = n[s2][2] = nc-255
+            n[nc][1], n[nc][0] = s1, s2
             nc += 1
+        c.nodes = [(l, r) for l, r, _, _ in n]
+        return c.nodes
 
-    def decompress(self, src):
+    @classmethod
+    def table(c):
+        if c.sym is not None:
+            return c.sym, c.ln
+        n, B = c.tree(), c.B
+        sym, ln = [b'']*(1 << B), Z(1 << B)
+        for w in range(1 << B):
+            o, b = bytearray(), 0
+            while b < B:
+                if not (w >> b) & 1:
+                    # flag bit 0: 8 bit literal
+                    if b+9 > B:
+                        break
+                    o.append((w >> (b+1)) & 255)
+                    b += 9
+                    continue
+                k, e = 510, b+1
+                while k >= 256 and e < B:
+                    k = n[k][(w >> e) & 1]
+                    e += 1
+                if k >= 256:
+                    break
+                o.append(k)
+                b = e
+            sym[w], ln[w] = bytes(o), b
+        c.sym, c.ln = sym, ln
+        return sym, ln
+
+    @classmethod
+    def decompress(c, src):
         if not src:
             return b''
-        rem, comp = src[0] & 15, src[0] >> 7
-        if not comp:
-            return src
-        out, ptr, l = bytearray(), src[1:], len(src)
-        bl = ((l-1)*8)-rem
+        if not src[0] >> 7:
+            # not compressed, only the header byte to drop
+            return bytes(src[1:])
+        sym, ln = c.table()
+        m = (1 << c.B)-1
+        bl = ((len(src)-1)*8)-(src[0] & 15)
+        p = bytes(src[1:])+bytes(3)
+        out = bytearray()
         bit = 0
         while bit < bl:
-            m_bit = (ptr[bit >> 3] >> (bit & 7)) & 1
+            i = bit >> 3
+            w = ((p[i] | p[i+1] << 8 | p[i+2] << 16) >> (bit & 7)) & m
+            k = ln[w]
+            if k and bit+k <= bl:
+                out += sym[w]
+                bit += k
+                continue
+            bit = c._slow(p, bit, bl, out.append)
+            if bit is None:
+                break
+        return bytes(out)
+
+    @classmethod
+    def _slow(c, p, bit, bl, ap):
+        n = c.tree()
+        f = (p[bit >> 3] >> (bit & 7)) & 1
+        bit += 1
+        if not f:
+            if bit+8 > bl:
+                return None
+            i = bit >> 3
+            ap(((p[i] | p[i+1] << 8) >> (bit & 7)) & 255)
+            return bit+8
+        k = 510
+        while k >= 256:
+            if bit >= bl:
+                raise ValueError("Incomplete Huffman code")
+            k = n[k][(p[bit >> 3] >> (bit & 7)) & 1]
             bit += 1
-            if m_bit:
-                n = 510
-                while n >= 256:
-                    if bit >= bl:
-                        raise ValueError("Incomplete Huffman code")
-                    p_bit = (ptr[bit >> 3] >> (bit & 7)) & 1
-                    bit += 1
-                    n = self.nodes[n].l if p_bit == 0 else self.nodes[n].r
-                out.append(n)
-            else:
-                if bit+8 > bl:
+        ap(k)
+        return bit
+
+    @classmethod
+    def messages(c, path):
+        """
+        Yields (offset, message) for every message of the replay at
+        path, straight from an mmap of it. message is a memoryview,
+        only valid until the next one is asked for.
+        """
+        with open(path, 'rb') as f:
+            try:
+                m = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # empty file
+                return
+        v, n, o = memoryview(m), len(m), 6
+        try:
+            while o < n:
+                a, k = o, v[o]
+                if k < 254:
+                    o += 1
+                elif k == 254:
+                    if o+3 > n:
+                        break
+                    k, o = v[o+1] | v[o+2] << 8, o+3
+                else:
+                    if o+5 > n:
+                        break
+                    k, o = int.from_bytes(v[o+1:o+5], 'little'), o+5
+                if not k:
+                    continue
+                if o+k > n:
+                    # cut off, by a crash or still being recorded
                     break
-                bi, b_in_b = bit >> 3, bit & 7
-                val = ptr[bi]if b_in_b == 0 else (ptr[bi] >> b_in_b) | (ptr[bi+1] << (8-b_in_b))
-                out.append(val & 255)
-                bit += 8
-        return bytes(out)
+                src = v[o:o+k]
+                o += k
+                if src[0] >> 7:
+                    yield a, memoryview(c.decompress(src))
+                else:
+                    yield a, src[1:]
+                src = None
+        finally:
+            v.release()
+            try:
+                m.close()
+            except BufferError:
+                # a message is still held on to, gc closes it later
+                pass
 
+    @classmethod
+    def commands(c, path):
+        """
+        Yields (offset, command, payload) for every session command of
+        the replay at path, offset being where its message starts in
+        the file. See CMD_NAMES for commands, payload is a memoryview.
+        """
+        for o, m in c.messages(path):
+            if not len(m) or m[0] != 1:
+                continue
+            i, n = 1, len(m)
+            while i+2 <= n:
+                k = m[i] | m[i+1] << 8
+                d = m[i+2:i+2+k]
+                i += 2+k
+                if len(d):
+                    yield o, d[0], d[1:]
 
-def GMS(_h, brp_path, par):
-    total_ms = 0
-    with open(brp_path, 'rb') as f:
-        f.seek(0, 2)
-        par[1] = f.tell()
-        f.seek(6)
-        while True:
+    @classmethod
+    def duration(c, path, par=None):
+        """
+        Milliseconds the replay at path lasts. par, if given, is kept
+        updated as [bytes read, file size].
+        """
+        t = 0
+        if par:
+            par[1] = getsize(path)
+        for o, cmd, p in c.commands(path):
             if par:
-                par[0] = f.tell()
-            b_data = f.read(1)
-            if not b_data:
-                break
-            b1, comp_len = b_data[0], 0
-            if b1 < 254:
-                comp_len = b1
-            elif b1 == 254:
-                comp_len = int.from_bytes(f.read(2), 'little')
-            else:  # 255
-                comp_len = int.from_bytes(f.read(4), 'little')
-            if comp_len == 0:
-                continue
-            raw_msg = _h.decompress(f.read(comp_len))
-            if not raw_msg or raw_msg[0] != 1:
+                par[0] = o
+            if cmd == 0 and len(p):
+                t += p[0]
+        if par:
+            par[0] = par[1]
+        return t
+
+    @classmethod
+    def codes(c):
+        """
+        What to write for every byte, as (bits, bit count) with bits
+        LSB first: flag 1 and its Huffman code, or flag 0 and the byte
+        itself when its code is 8 bits or longer.
+        """
+        if c.cds is not None:
+            return c.cds
+        n = c.tree()
+        cds = [None]*256
+        st = [(510, 0, 0)]
+        while st:
+            k, v, ln = st.pop()
+            if k < 256:
+                cds[k] = (1 | v << 1, ln+1) if ln+1 < 9 else (k << 1, 9)
                 continue
-            sub_off = 1
-            while sub_off < len(raw_msg):
+            st.append((n[k][0], v, ln+1))
+            st.append((n[k][1], v | 1 << ln, ln+1))
+        c.cds = cds
+        return cds
+
+    @classmethod
+    def compress(c, raw):
+        """
+        Counterpart of decompress. Messages that don't get any smaller
+        are stored as they are, behind a zero header byte.
+        """
+        cds = c.codes()
+        out = bytearray(1)
+        acc = nb = 0
+        for b in raw:
+            v, k = cds[b]
+            acc |= v << nb
+            nb += k
+            if nb >= 64:
+                out += (acc & 0xffffffffffffffff).to_bytes(8, 'little')
+                acc >>= 64
+                nb -= 64
+        out += acc.to_bytes((nb+7) >> 3, 'little')
+        if len(out) > len(raw)+1:
+            return b'\0'+bytes(raw)
+        out[0] = 128 | (-nb & 7)
+        return bytes(out)
+
+    @staticmethod
+    def frame(m):
+        k = len(m)
+        if k < 254:
+            return bytes((k,))+m
+        if k < 65536:
+            return b'\xfe'+k.to_bytes(2, 'little')+m
+        return b'\xff'+k.to_bytes(4, 'little')+m
+
+    @classmethod
+    def clip(c, path, out, a, b, par=None):
+        """
+        Writes what happens between a and b milliseconds into the
+        replay at path to out, as a replay of its own. Everything
+        before a is kept but time, scene steps and FX commands (which
+        would all go off at once), so the clip starts with the scene
+        set up, nothing after b is. Streams message by message, memory
+        use doesn't grow with the replay.
+        Returns the clip's duration, par works like in duration.
+        """
+        with open(path, 'rb') as f:
+            hd = f.read(6)
+        if par:
+            par[1] = getsize(path)
+        t = d = 0
+        tmp = out+'.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(hd)
+                for o, m in c.messages(path):
+                    if par:
+                        par[0] = o
+                    if t >= b:
+                        break
+                    if not len(m) or m[0] != 1:
+                        f.write(c.frame(c.compress(m)))
+                        continue
+                    r = bytearray(b'\1')
+                    i, n = 1, len(m)
+                    while i+2 <= n:
+                        k = m[i] | m[i+1] << 8
+                        e = m[i+2:i+2+k]
+                        if len(e) and e[0] == 0:
+                            w = e[1] if len(e) > 1 else 0
+                            if t < a:
+                                t += w
+                                i += 2+k
+                                continue
+                            if t >= b:
+                                break
+                            t += w
+                            d += w
+                        elif len(e) and e[0] in c.FX and t < a:
+                            i += 2+k
+                            continue
+                        r += m[i:i+2+k]
+                        i += 2+k
+                    if len(r) > 1:
+                        f.write(c.frame(c.compress(r)))
+            replace(tmp, out)
+        except BaseException:
+            try:
+                remove(tmp)
+            except OSError:
+                pass
+            raise
+        if par:
+            par[0] = par[1]
+        return d
+
+
+class BRM:
+    """
+    Metadata of replays, cached in a json file in the mods folder and
+    keyed by path, size and mtime so a replay is only scanned once:
+    >>> from replay import BRM
+    >>> BRM.scan(paths, done)
+    >>> BRM.get(path)
+    {'key': [size, mtime], 'duration': ms, 'size': bytes,
+     'commands': {name: count}, 'first': text, 'last': text}
+
+    get() gives None for replays not scanned yet or changed since.
+    first and last are the first and last screen messages shown.
+    """
+    FILE = 'replay_meta.json'
+    WORKERS = 2
+    data = pool = None
+    lock = Lock()
+
+    @classmethod
+    def where(c):
+        return join(env()['python_directory_user'], c.FILE)
+
+    @classmethod
+    def load(c):
+        if c.data is None:
+            try:
+                with open(c.where()) as f:
+                    c.data = jl(f)
+            except (OSError, ValueError):
+                c.data = {}
+        return c.data
+
+    @classmethod
+    def save(c):
+        with c.lock:
+            c.data = {k: v for k, v in c.load().items() if exists(k)}
+            t = c.where()+'.tmp'
+            with open(t, 'w') as f:
+                jd(c.data, f)
+            replace(t, c.where())
+
+    @staticmethod
+    def key(path):
+        st = stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    @classmethod
+    def get(c, path):
+        m = c.load().get(abspath(path))
+        try:
+            return m if m and m['key'] == c.key(path) else None
+        except OSError:
+            return None
+
+    @staticmethod
+    def text(cmd, p):
+        # top messages start with two texture ids, then both have
+        # an int32 length and the utf-8 text (often an Lstr json)
+        i = 8 if cmd == 51 else 0
+        if len(p) < i+4:
+            return None
+        n = int.from_bytes(p[i:i+4], 'little')
+        return bytes(p[i+4:i+4+n]).decode('utf-8', 'replace')
+
+    @classmethod
+    def read(c, path, par=None):
+        """
+        Metadata of the replay at path, scanning it if the cache has
+        none. par works like in BRP.duration. Doesn't save the cache.
+        """
+        m = c.get(path)
+        if m:
+            if par:
+                par[0] = par[1] = m['size']
+            return m
+        m = c.parse(path, par)
+        c.put(path, m)
+        return m
+
+    @classmethod
+    def put(c, path, m):
+        with c.lock:
+            c.load()[abspath(path)] = m
+
+    @classmethod
+    def chunk(c, paths):
+        # runs on a scanner worker, results are cached by the scan
+        # thread as each chunk finishes so a cancel keeps them whole
+        a = []
+        for _ in paths:
+            try:
+                a.append((_, c.parse(_)))
+            except OSError:
+                pass
+        return a
+
+    @classmethod
+    def parse(c, path, par=None):
+        """
+        Scans the replay at path for its metadata, cache aside.
+        """
+        k = c.key(path)
+        if par:
+            par[1] = k[0]
+        t, h, sm = 0, Z(256), []
+        try:
+            for o, cmd, p in BRP.commands(path):
+                if par:
+                    par[0] = o
+                h[cmd] += 1
+                if cmd == 0 and len(p):
+                    t += p[0]
+                elif cmd in (50, 51):
+                    sm.append(c.text(cmd, p))
+                    del sm[1:-1]
+        except Exception:
+            # broken replay, same as an unplayable one
+            t = 0
+        if par:
+            par[0] = par[1]
+        cn = CMD_NAMES()
+        m = {
+            'key': k,
+            'duration': t,
+            'size': k[0],
+            'commands': {cn.get(i, str(i)): n for i, n in enumerate(h) if n},
+            'first': sm[0] if sm else None,
+            'last': sm[-1] if sm else None
+        }
+        return m
+
+    @classmethod
+    def scan(c, paths, progress=None, done=None):
+        """
+        Scans the replays at paths the cache has nothing on, see BRS.
+        """
+        return BRS(paths, progress, done)
+
+
+class BRS:
+    """
+    Scans replays into BRM's cache on a pool of worker threads, which
+    spend most of their time reading and inflating files with the GIL
+    released:
+    >>> s = BRS(paths, progress, done)
+    >>> s.cancel()
+
+    Replays go out in chunks of about CHUNK bytes, biggest first.
+    progress(bytes scanned, bytes total) and done() are called from
+    the logic thread through teck, done() once the cache is saved, or
+    failed to. Each scan has its own pool, set up and shut down off
+    the logic thread. Processes aren't used: spawning starts another
+    game, and forking one with its audio, render and network threads
+    running isn't safe.
+    """
+    CHUNK = 4 << 20
+    WORKERS = max(1, min(4, (cpu_count() or 2)-1))
+
+    def __init__(s, paths, progress=None, done=None):
+        s.progress, s.done = progress, done
+        s.off = s.fin = False
+        s.pool = s.err = None
+        a = []
+        for _ in paths:
+            try:
+                if BRM.get(_) is None:
+                    a.append((getsize(_), _))
+            except OSError:
+                pass
+        a.sort(reverse=True)
+        s.total, s.got = sum(n for n, _ in a), 0
+        s.chs, ch, n = [], [], 0
+        for i, (k, _) in enumerate(a):
+            ch.append(_)
+            n += k
+            if n >= s.CHUNK or i == len(a)-1:
+                s.chs.append((ch, n))
+                ch, n = [], 0
+        Thread(target=s.run).start()
+        teck(0.1, s.tick)
+
+    def run(s):
+        if s.chs:
+            w = min(s.WORKERS, len(s.chs))
+            pool = ThreadPoolExecutor(w, 'replay_scan')
+            fs = {pool.submit(BRM.chunk, ch): n for ch, n in s.chs}
+            # only now, so a cancel can't shut it down halfway through
+            s.pool = pool
+            if s.off:
+                s.pool.shutdown(wait=False, cancel_futures=True)
+            # in order, as_completed never sees futures that the
+            # shutdown cancelled
+            for f in fs:
                 try:
-                    sub_size = int.from_bytes(raw_msg[sub_off:sub_off+2], 'little')
-                except IndexError:
-                    break
-                except ValueError:
-                    break
-                sub_data = raw_msg[sub_off+2:sub_off+2+sub_size]
-                if sub_data and sub_data[0] == 0:
-                    total_ms += sub_data[1]
-                sub_off += 2 + sub_size
-    if par:
-        par[0] = par[1]
-    return total_ms
+                    a = f.result()
+                except Exception:
+                    # cancelled, or a broken replay or pool
+                    continue
+                for p, m in a:
+                    BRM.put(p, m)
+                s.got += fs[f]
+            s.pool.shutdown(wait=False)
+        # also after a cancel, for the chunks that were running
+        try:
+            BRM.save()
+        except OSError as e:
+            # the scan is still cached until the game closes
+            s.err = e
+        finally:
+            s.fin = True
+
+    def cancel(s):
+        s.off = True
+        s.pool and s.pool.shutdown(wait=False, cancel_futures=True)
+
+    def tick(s):
+        if s.off:
+            return
+        s.progress and s.progress(s.got, s.total)
+        if s.fin:
+            s.err and BTW("Couldn't save replay lengths!")
+            s.done and s.done()
+            return
+        teck(0.1, s.tick)
+
 
 # brobord collide grass
 # ba_meta require api 9
@@ -6,6 +6,7 @@ Share replays easily with your friends or have a backup
 
 Exported replays are stored in replays folder which is inside mods folder
 You can start sharing replays by opening the watch window and going to share replay tab
+Replay durations are shown too if the Replay plugin is installed
 
 Feel free to let me know if you use this plugin,i love to hear that :)
 
@@ -31,6 +32,11 @@ from bauiv1lib.tabs import TabRow
 from bauiv1lib.confirm import ConfirmWindow
 from bauiv1lib.watch import WatchWindow
 from bauiv1lib.popup import PopupWindow
+try:
+    # replay plugin, caches replay durations
+    from replay import BRM
+except ImportError:
+    BRM = None
 
 
 title = "SHARE REPLAY"
@@ -56,6 +62,11 @@ def Print(*args, color=None):
     bui.screenmessage(out, color=color)
 
 
+def format_duration(milliseconds):
+    minutes, seconds = divmod(milliseconds // 1000, 60)
+    return f"{minutes}:{seconds:02}"
+
+
 def cprint(*args):
     out = ""
     for arg in args:
@@ -156,6 +167,7 @@ class ShareTabUi(WatchWindow):
     def __init__(self, root_widget=None):
         self.tab_id = MyTabId.INTERNAL
         self.selected_replay = None
+        self.scanner = None
 
         if root_widget is None:
             self.root = bui.Window(bui.containerwidget(
@@ -179,9 +191,11 @@ class ShareTabUi(WatchWindow):
         t_scale = 1.6
 
         if tab_id == MyTabId.INTERNAL:
+            directory = internal_dir
             dir_list = listdir(internal_dir)
             bui.buttonwidget(edit=self.share_button, label="Export\nReplay")
         else:
+            directory = external_dir
             dir_list = listdir(external_dir)
             bui.buttonwidget(edit=self.share_button, label="Import\nReplay")
 
@@ -192,6 +206,10 @@ class ShareTabUi(WatchWindow):
             for i in existing_widgets:
                 i.delete()
         height = 900
+        self.pending_durations = []
+        if self.scanner:
+            self.scanner.cancel()
+            self.scanner = None
         for i in dir_list:  # making textwidgets for all replays
             height -= 50
             a = i
@@ -206,6 +224,32 @@ class ShareTabUi(WatchWindow):
                 click_activate=True,
                 always_highlight=True,)
             bui.textwidget(edit=i, on_activate_call=babase.Call(self.on_select_text, i, a))
+            if BRM and a.endswith(".brp"):
+                self.pending_durations.append((i, directory+a))
+        if self.pending_durations:
+            # durations show up as the replay plugin scans the replays
+            self.scanner = BRM.scan([replay for _, replay in self.pending_durations])
+            self.update_durations(self.pending_durations)
+
+    def update_durations(self, pending_durations):
+        if pending_durations is not self.pending_durations:
+            # the tab was changed since
+            return
+        if not any(widget.exists() for widget, _ in pending_durations):
+            # the window was closed
+            self.scanner.cancel()
+            return
+        for widget, replay in pending_durations[:]:
+            metadata = BRM.get(replay)
+            if not widget.exists():
+                pending_durations.remove((widget, replay))
+            elif metadata:
+                name = path.basename(replay).split(".")[0]
+                duration = format_duration(metadata["duration"])
+                bui.textwidget(edit=widget, text=f"{name}  ({duration})")
+                pending_durations.remove((widget, replay))
+        if pending_durations:
+            bui.apptimer(0.5, babase.Call(self.update_durations, pending_durations))
 
     def draw_ui(self):
         self._r = 'watchWindow'
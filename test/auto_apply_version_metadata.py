@@ -1,15 +1,56 @@
 import hashlib
+import difflib
+import gzip
 import json
 import os
 import sys
 import re
 import datetime
+import subprocess
+
+# Number of previous versions of a plugin to generate patches from whenever
+# a new version of it is released.
+MAX_PATCHES_PER_VERSION = 3
 
 
 def get_comparable_version_tuple_from_string(version_string):
     return tuple(map(int, version_string.split(".")))
 
 
+def get_file_content_at_commit(commit_sha, path):
+    posix_path = path.replace(os.sep, "/")
+    process = subprocess.run(
+        ["git", "show", f"{commit_sha}:{posix_path}"],
+        capture_output=True,
+    )
+    if process.returncode != 0:
+        return None
+    return process.stdout
+
+
+def create_line_patch(old_content, new_content):
+    """
+    Create a line based patch that turns `old_content` into `new_content`.
+
+    The patch is a list of operations; a positive integer copies that many
+    lines from the old content, a negative integer skips that many lines of
+    the old content, and a string is inserted as is.
+    """
+    old_lines = old_content.decode("utf-8", "surrogateescape").splitlines(keepends=True)
+    new_lines = new_content.decode("utf-8", "surrogateescape").splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    operations = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append(i2 - i1)
+            continue
+        if i2 > i1:
+            operations.append(i1 - i2)
+        if j2 > j1:
+            operations.append("".join(new_lines[j1:j2]))
+    return operations
+
+
 class PluginVersionMetadata:
     def __init__(self, plugin_name, version_name, plugin_path, from_json={}):
         self.plugin_name = plugin_name
@@ -73,6 +114,58 @@ class PluginVersionMetadata:
         md5sum = hashlib.md5(self._content).hexdigest()
         return md5sum
 
+    def get_patch_path(self, from_version_name):
+        return os.path.join(
+            os.path.dirname(self.plugin_path),
+            "patches",
+            self.plugin_name,
+            f"{from_version_name}-{self.version_name}.json",
+        )
+
+    def set_patches(self, max_patches=MAX_PATCHES_PER_VERSION):
+        if self._content is None:
+            with open(self.plugin_path, "rb") as fin:
+                self._content = fin.read()
+
+        versions = self.json["plugins"][self.plugin_name]["versions"]
+        previous_versions = sorted(
+            (
+                (version_name, version_metadata)
+                for version_name, version_metadata in versions.items()
+                if version_metadata is not None and
+                get_comparable_version_tuple_from_string(version_name) <
+                get_comparable_version_tuple_from_string(self.version_name)
+            ),
+            key=lambda version: get_comparable_version_tuple_from_string(version[0]),
+            reverse=True,
+        )[:max_patches]
+
+        patches = []
+        for version_name, version_metadata in previous_versions:
+            previous_content = get_file_content_at_commit(
+                version_metadata["commit_sha"],
+                self.plugin_path,
+            )
+            if previous_content is None:
+                continue
+            patch = json.dumps({
+                "from_md5sum": hashlib.md5(previous_content).hexdigest(),
+                "md5sum": self.calculate_md5sum(),
+                "operations": create_line_patch(previous_content, self._content),
+            }, separators=(",", ":")).encode("utf-8")
+            if len(patch) >= len(self._content):
+                # Downloading the whole plugin would be cheaper.
+                continue
+            patch_path = self.get_patch_path(version_name)
+            os.makedirs(os.path.dirname(patch_path), exist_ok=True)
+            with open(patch_path, "wb") as fout:
+                fout.write(patch)
+            patches.append(version_name)
+
+        if patches:
+            versions[self.version_name]["patches"] = patches
+        return self
+
     def sort_versions(self):
         if self._content is None:
             with open(self.plugin_path, "rb") as fin:
@@ -142,6 +235,7 @@ class CategoryVersionMetadata:
                       .set_commit_sha(commit_sha)
                       .set_released_on(today)
                       .set_md5sum()
+                      .set_patches()
                       .sort_versions()
                       .json
             )
@@ -200,6 +294,38 @@ class PluginManagerVersionMetadata:
             )
 
 
+class CatalogBundle:
+    """
+    A single gzipped file holding index.json along with the metadata of every
+    category it lists, so plugin manager can fetch all of it in one request.
+    """
+
+    def __init__(self):
+        self.index_path = "index.json"
+        self.bundle_path = "catalog.json.gz"
+
+    def get_category_path(self, category_url):
+        return category_url.split("/{content_type}/{tag}/", 1)[1]
+
+    def build(self):
+        with open(self.index_path, "rb") as fin:
+            index = json.load(fin)
+        categories = {}
+        for category_url in index["categories"]:
+            with open(self.get_category_path(category_url), "rb") as fin:
+                categories[category_url] = json.load(fin)
+        return {
+            "index": index,
+            "categories": categories,
+        }
+
+    def save(self, bundle):
+        content = json.dumps(bundle, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with open(self.bundle_path, "wb") as fout:
+            # A fixed mtime keeps the output reproducible for the same metadata.
+            fout.write(gzip.compress(content, mtime=0))
+
+
 def auto_apply_version_metadata(last_commit_sha):
     plugin_manager = PluginManagerVersionMetadata()
     metadata = plugin_manager.apply_version_metadata_to_null_version_value(last_commit_sha)
@@ -217,6 +343,9 @@ def auto_apply_version_metadata(last_commit_sha):
     category_json = minigames.apply_version_metadata_to_null_version_values(last_commit_sha)
     minigames.save(category_json)
 
+    catalog_bundle = CatalogBundle()
+    catalog_bundle.save(catalog_bundle.build())
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,301 @@
+"""
+Offline benchmarks for the hot paths of plugin_manager.py.
+
+Builds synthetic catalogs out of index.json and the category JSONs in this
+repository at several scales, serves them from a local HTTP server and
+measures how long plugin manager takes to load them, to resolve the latest
+compatible version of every plugin (one by one and through the compatibility
+index), to filter plugins by a search term and to install plugins in
+parallel. No network access or game install is needed; plugin manager runs
+against its headless runtime.
+
+Run it from the root of the repository:
+
+    $ python test/benchmark_catalog.py
+    $ python test/benchmark_catalog.py --scales 1,10 --repeat 3 --json before.json
+"""
+import argparse
+import functools
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.getcwd())
+
+import plugin_manager  # noqa: E402
+
+CATEGORY_NAMES = ("utilities", "minigames", "maps")
+# Number of plugins installed per 1x of scale.
+INSTALLS_PER_SCALE = 10
+SEARCH_TERMS = ("c", "ca", "cam", "came", "camer", "camera", "ra", "s", "sa", "by")
+
+
+class QuietHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Lets plugin manager keep its connections alive like it would with GitHub.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_plugin_content(name):
+    lines = [
+        "# ba_meta require api 9\n",
+        "import babase\n\n\n",
+        "# ba_meta export babase.Plugin\n",
+        f"class {name.title().replace('_', '')}(babase.Plugin):\n",
+        "    pass\n",
+    ]
+    # Real plugins are a few tens of KB in size.
+    lines.extend(f"# {name} {i:04d}\n" for i in range(1000))
+    return "".join(lines).encode("utf-8")
+
+
+class SyntheticSite:
+    """
+    A copy of the repository's metadata with every category holding `scale`
+    times as many plugins, served over HTTP from a temporary directory.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.directory = tempfile.mkdtemp(prefix="plugin_manager_benchmark_")
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            functools.partial(QuietHTTPRequestHandler, directory=self.directory),
+        )
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.installable_plugin_names = []
+
+    def get_path(self, *parts):
+        path = os.path.join(self.directory, "raw", "main", *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def build_category(self, category_name):
+        with open(os.path.join("plugins", f"{category_name}.json"), "rb") as fin:
+            category = json.load(fin)
+        category["plugins_base_url"] = (
+            f"{self.base_url}/{{content_type}}/{{tag}}/plugins/{category_name}"
+        )
+        plugins = {}
+        for replica in range(self.scale):
+            for name, info in category["plugins"].items():
+                if replica:
+                    name = f"{name}_{replica}"
+                content = create_plugin_content(name)
+                md5sum = hashlib.md5(content).hexdigest()
+                versions = {
+                    number: {**version_info, "md5sum": md5sum, "patches": []}
+                    for number, version_info in info["versions"].items()
+                    # Versions that CI hasn't filled in the metadata for yet.
+                    if version_info is not None
+                }
+                if not versions:
+                    continue
+                plugins[name] = {**info, "versions": versions}
+                latest_version_info = next(iter(versions.values()))
+                if latest_version_info["api_version"] == plugin_manager._app_api_version:
+                    # Only plugins whose latest version is compatible get
+                    # downloaded from the "main" tag.
+                    with open(self.get_path("plugins", category_name, f"{name}.py"), "wb") as fout:
+                        fout.write(content)
+                    self.installable_plugin_names.append(name)
+        category["plugins"] = plugins
+        return category
+
+    def build(self):
+        with open("index.json", "rb") as fin:
+            index = json.load(fin)
+        index["categories"] = [
+            f"{self.base_url}/{{content_type}}/{{tag}}/plugins/{category_name}.json"
+            for category_name in CATEGORY_NAMES
+        ]
+        categories = {}
+        for category_name, category_url in zip(CATEGORY_NAMES, index["categories"]):
+            category = self.build_category(category_name)
+            categories[category_url] = category
+            with open(self.get_path("plugins", f"{category_name}.json"), "w") as fout:
+                json.dump(category, fout)
+        with open(self.get_path("index.json"), "w") as fout:
+            json.dump(index, fout)
+        catalog = json.dumps({"index": index, "categories": categories}).encode("utf-8")
+        with open(self.get_path("catalog.json.gz"), "wb") as fout:
+            fout.write(gzip.compress(catalog, mtime=0))
+        self.categories = categories
+        return self
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class CatalogBenchmark:
+    def __init__(self, site, repeat):
+        self.site = site
+        self.repeat = repeat
+        self.scratch_directory = tempfile.mkdtemp(prefix="plugin_manager_benchmark_")
+
+    def reset_plugin_manager(self):
+        """
+        Make plugin manager start from a clean slate, as if it was just launched
+        on a fresh install.
+        """
+        scratch_directory = tempfile.mkdtemp(dir=self.scratch_directory)
+        plugin_manager.REPOSITORY_URL = self.site.base_url
+        plugin_manager.PLUGIN_DIRECTORY = os.path.join(scratch_directory, "mods")
+        os.makedirs(plugin_manager.PLUGIN_DIRECTORY)
+        plugin_manager._CACHE.clear()
+        plugin_manager._NETWORK_CACHE = plugin_manager.NetworkCache(
+            os.path.join(scratch_directory, "network"))
+        plugin_manager._LOCAL_PLUGIN_INDEX = plugin_manager.LocalPluginIndex(
+            os.path.join(scratch_directory, "local_plugins.json"))
+        plugin_manager._PLUGIN_STORE = plugin_manager.PluginStore(
+            os.path.join(scratch_directory, "store"))
+        plugin_manager.babase.app.config = plugin_manager.HeadlessConfig()
+        plugin_manager.babase.app.config["Plugins"] = {}
+        plugin_manager.StartupTasks().setup_config()
+
+    def run(self, function):
+        """
+        Call `function` `self.repeat` times, each from a clean slate, and return
+        how long each call took in milliseconds.
+        """
+        timings = []
+        for _ in range(self.repeat):
+            self.reset_plugin_manager()
+            timings.append(plugin_manager.loop.run_until_complete(function()))
+        return timings
+
+    async def load_catalog(self):
+        start = time.perf_counter()
+        manager = plugin_manager.PluginManager()
+        await manager.setup_index()
+        await manager.categories["All"].get_plugins()
+        return (time.perf_counter() - start) * 1000
+
+    async def parse_catalog(self):
+        start = time.perf_counter()
+        categories = []
+        for meta_url, metadata in self.site.categories.items():
+            category = plugin_manager.Category(meta_url)
+            category.load_snapshot(json.loads(json.dumps(metadata)))
+            categories.append(category)
+        await plugin_manager.PluginManager().set_categories(categories)
+        return (time.perf_counter() - start) * 1000
+
+    async def get_plugins(self):
+        manager = plugin_manager.PluginManager()
+        await manager.setup_index()
+        return await manager.categories["All"].get_plugins()
+
+    async def resolve_versions(self):
+        plugins = await self.get_plugins()
+        start = time.perf_counter()
+        for plugin in plugins:
+            try:
+                plugin.latest_compatible_version
+            except plugin_manager.NoCompatibleVersion:
+                pass
+        return (time.perf_counter() - start) * 1000
+
+    async def build_compatibility_index(self):
+        plugins = await self.get_plugins()
+        start = time.perf_counter()
+        compatibility_index = plugin_manager.CompatibilityIndex(
+            plugins, plugin_manager._app_api_version)
+        compatibility_index.filter(plugins)
+        return (time.perf_counter() - start) * 1000
+
+    async def search(self):
+        plugins = await self.get_plugins()
+        start = time.perf_counter()
+        search_index = plugin_manager.PluginSearchIndex(plugins)
+        for search_term in SEARCH_TERMS:
+            search_index.search(search_term)
+        return (time.perf_counter() - start) * 1000
+
+    async def install(self):
+        plugins = {plugin.name: plugin for plugin in await self.get_plugins()}
+        to_install = [
+            plugins[name] for name in
+            self.site.installable_plugin_names[:INSTALLS_PER_SCALE * self.site.scale]
+        ]
+        updater = plugin_manager.PluginUpdater()
+        start = time.perf_counter()
+        updated, failed = await updater.update(to_install)
+        elapsed = (time.perf_counter() - start) * 1000
+        if failed:
+            raise RuntimeError(f"Failed to install {len(failed)} plugins during the benchmark.")
+        plugin_manager._CONNECTION_POOL.close()
+        return elapsed
+
+    def execute(self):
+        try:
+            return {
+                "load_catalog": self.run(self.load_catalog),
+                "parse_catalog": self.run(self.parse_catalog),
+                "resolve_versions": self.run(self.resolve_versions),
+                "compatibility_index": self.run(self.build_compatibility_index),
+                "search": self.run(self.search),
+                "install": self.run(self.install),
+            }
+        finally:
+            plugin_manager._CONNECTION_POOL.close()
+            shutil.rmtree(self.scratch_directory, ignore_errors=True)
+
+
+def benchmark(scales, repeat):
+    results = {}
+    for scale in scales:
+        site = SyntheticSite(scale).build().start()
+        try:
+            plugin_count = sum(len(category["plugins"]) for category in site.categories.values())
+            install_count = min(INSTALLS_PER_SCALE * scale, len(site.installable_plugin_names))
+            timings = CatalogBenchmark(site, repeat).execute()
+        finally:
+            site.stop()
+        results[f"{scale}x"] = {
+            "plugins": plugin_count,
+            "installs": install_count,
+            "timings_ms": timings,
+        }
+    return results
+
+
+def print_results(results):
+    print(f"{'scale':<7}{'benchmark':<21}{'plugins':>9}{'min ms':>11}{'median ms':>11}")
+    for scale, result in results.items():
+        for name, timings in result["timings_ms"].items():
+            count = result["installs"] if name == "install" else result["plugins"]
+            print(f"{scale:<7}{name:<21}{count:>9}"
+                  f"{min(timings):>11.2f}{statistics.median(timings):>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark plugin manager's hot paths offline.")
+    parser.add_argument("--scales", default="1,10,100",
+                        help="comma separated catalog sizes, relative to the current one")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of times each benchmark is run")
+    parser.add_argument("--json", help="also write the timings to this file")
+    args = parser.parse_args()
+
+    results = benchmark([int(scale) for scale in args.scales.split(",")], args.repeat)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=2)
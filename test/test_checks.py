@@ -1,5 +1,6 @@
 import git
 
+import gzip
 import hashlib
 import json
 import re
@@ -89,6 +90,24 @@ class TestPluginManagerMetadata(unittest.TestCase):
                 self.fail(f"Changelog entry for plugin manager {version} is missing.")
 
 
+class TestCatalogBundleMetadata(unittest.TestCase):
+    def setUp(self):
+        with open("index.json", "rb") as fin:
+            self.index = json.load(fin)
+        with gzip.open("catalog.json.gz", "rb") as fin:
+            self.bundle = json.load(fin)
+
+    def test_index(self):
+        self.assertEqual(self.bundle["index"], self.index)
+
+    def test_categories(self):
+        self.assertEqual(list(self.bundle["categories"].keys()), self.index["categories"])
+        for category_url, category_metadata in self.bundle["categories"].items():
+            category_metadata_file = category_url.split("/{content_type}/{tag}/", 1)[1]
+            with open(category_metadata_file, "rb") as fin:
+                self.assertEqual(category_metadata, json.load(fin))
+
+
 class TestPluginMetadata(unittest.TestCase):
     def setUp(self):
         self.category_directories = tuple(
@@ -164,6 +183,26 @@ class BaseCategoryMetadataTestCases:
                     self.assertEqual(int(api_version.decode("utf-8")),
                                      version_metadata["api_version"])
 
+        def test_patches(self):
+            for plugin_name, plugin_metadata in self.content["plugins"].items():
+                versions = plugin_metadata["versions"]
+                for version_name, version_metadata in versions.items():
+                    if version_metadata is None:
+                        # Filled in by CI once the new version is merged.
+                        continue
+                    for from_version_name in version_metadata.get("patches", []):
+                        patch_path = os.path.join(
+                            self.category,
+                            "patches",
+                            plugin_name,
+                            f"{from_version_name}-{version_name}.json",
+                        )
+                        with open(patch_path, "rb") as fin:
+                            patch = json.load(fin)
+                        self.assertEqual(patch["from_md5sum"],
+                                         versions[from_version_name]["md5sum"])
+                        self.assertEqual(patch["md5sum"], version_metadata["md5sum"])
+
         def test_latest_version(self):
             for plugin_name, plugin_metadata in self.content["plugins"].items():
                 latest_version_name, latest_version_metadata = tuple(